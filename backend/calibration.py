@@ -16,8 +16,12 @@ class Calibrator:
     
     # Default raster density when converting press dimensions to pixels for raw renders
     PIXELS_PER_MM = 10
+    # Raster pixels around the press the warp may still sample from (bicubic support is 2)
+    ROI_RASTER_PAD = 2
 
     def __init__(self):
+        self._remap_cache = None  # ((output size, raster size), roi, map1, map2) for the current matrix
+        self._transformation_matrix_inv = None  # Lazily computed inverse of the current matrix
         self.source_points = None  # Points in projector space
         self.destination_points = None  # Points in press raster space (pixels)
         self.transformation_matrix = None
@@ -51,6 +55,27 @@ class Calibrator:
         return True
 
 
+    @property
+    def transformation_matrix(self):
+        """Perspective matrix mapping projector pixels to press raster pixels."""
+        return self._transformation_matrix
+
+    @transformation_matrix.setter
+    def transformation_matrix(self, value) -> None:
+        # Drop the inverse and the remap cache on every matrix update
+        self._transformation_matrix = value
+        self._transformation_matrix_inv = None
+        self._remap_cache = None
+
+    @property
+    def transformation_matrix_inv(self):
+        """Inverse perspective matrix (press raster -> projector), computed once per calibration."""
+        if self._transformation_matrix_inv is None and self._transformation_matrix is not None:
+            # Contiguous float64 is what cv2 expects, so the bindings never copy it per call
+            self._transformation_matrix_inv = np.ascontiguousarray(
+                np.linalg.inv(self._transformation_matrix), dtype=np.float64)
+        return self._transformation_matrix_inv
+
     @property
     def raw_width_px(self) -> int:
         if self.press_width_mm is None:
@@ -110,6 +135,109 @@ class Calibrator:
 
         return True
 
+    def get_raster_warp_matrix(self, raster_width: int, raster_height: int) -> np.ndarray:
+        """
+        Get the matrix warping a press raster of the given size into projector space.
+
+        Equals the inverse transformation matrix for a raster at full raw size; smaller
+        rasters are scaled back up to raw press pixels first.
+        """
+        if not self.is_calibrated():
+            raise ValueError("calibration not set")
+        if (raster_width, raster_height) == self.get_raw_size_px():
+            return self.transformation_matrix_inv
+        scale = np.diag([self.raw_width_px / raster_width, self.raw_height_px / raster_height, 1.0])
+        return self.transformation_matrix_inv @ scale
+
+    def get_projector_roi(self, output_width: int, output_height: int,
+                          raster_size: Tuple[int, int] = None) -> Tuple[int, int, int, int]:
+        """
+        Get the (x, y, width, height) projector rectangle the press raster warps into.
+
+        The bounding box of the warped raster corners, grown by the interpolation
+        footprint in raster space (so it also holds when the raster is upscaled), plus
+        one pixel for rounding, and clipped to the output. Falls back to the whole
+        output if a corner maps behind the projection center.
+        """
+        raster_size = tuple(raster_size) if raster_size is not None else self.get_raw_size_px()
+        rw, rh = raster_size
+        pad = self.ROI_RASTER_PAD
+        corners = np.array([[-pad, -pad, 1], [rw + pad, -pad, 1], [rw + pad, rh + pad, 1],
+                            [-pad, rh + pad, 1]], dtype=np.float64)
+        projected = corners @ self.get_raster_warp_matrix(rw, rh).T
+        if np.any(projected[:, 2] <= 0):
+            return 0, 0, int(output_width), int(output_height)
+        xy = projected[:, :2] / projected[:, 2:3]
+        x0 = max(0, int(np.floor(xy[:, 0].min())) - 1)
+        y0 = max(0, int(np.floor(xy[:, 1].min())) - 1)
+        x1 = min(int(output_width), int(np.ceil(xy[:, 0].max())) + 1)
+        y1 = min(int(output_height), int(np.ceil(xy[:, 1].max())) + 1)
+        return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+    def get_axis_aligned_placement(self, output_width: int, output_height: int,
+                                   raster_size: Tuple[int, int] = None):
+        """
+        Get where the raster lands if the warp is only a scale plus an integer shift.
+
+        Returns the (x, y, width, height) output rectangle the whole raster maps onto,
+        or None if the warp has rotation/shear/perspective, a fractional offset, or the
+        raster would be clipped by the output; such warps need the full sampler.
+        """
+        raster_size = tuple(raster_size) if raster_size is not None else self.get_raw_size_px()
+        m = self.get_raster_warp_matrix(*raster_size)
+        m = m / m[2, 2]
+        if abs(m[0, 1]) > 1e-9 or abs(m[1, 0]) > 1e-9 or abs(m[2, 0]) > 1e-12 or abs(m[2, 1]) > 1e-12:
+            return None
+        sx, sy, tx, ty = m[0, 0], m[1, 1], m[0, 2], m[1, 2]
+        x, y = int(round(tx)), int(round(ty))
+        w, h = int(round(raster_size[0] * sx)), int(round(raster_size[1] * sy))
+        if abs(tx - x) > 1e-6 or abs(ty - y) > 1e-6 or w <= 0 or h <= 0:
+            return None
+        if abs(raster_size[0] * sx - w) > 1e-6 or abs(raster_size[1] * sy - h) > 1e-6:
+            return None
+        if x < 0 or y < 0 or x + w > output_width or y + h > output_height:
+            return None
+        return x, y, w, h
+
+    def get_projector_remap(self, output_width: int, output_height: int,
+                            raster_size: Tuple[int, int] = None):
+        """
+        Get cv2.remap maps that warp a press raster into projector space.
+
+        Equivalent to warpPerspective with the inverse transformation matrix, but the
+        sampling grid is computed once per calibration and output size (fixed-point maps).
+        The maps only cover the projector ROI the press lands in; everything outside
+        it is black.
+
+        Args:
+            output_width: Projector width in pixels
+            output_height: Projector height in pixels
+            raster_size: (width, height) of the press raster; defaults to the raw size
+
+        Returns:
+            ((x, y, width, height) ROI, map1, map2); the maps are suitable for cv2.remap
+            into that ROI of the output
+        """
+        if not self.is_calibrated():
+            raise ValueError("calibration not set")
+        size = (int(output_width), int(output_height))
+        raster_size = tuple(raster_size) if raster_size is not None else self.get_raw_size_px()
+        key = (size, raster_size)
+        if self._remap_cache is None or self._remap_cache[0] != key:
+            roi = self.get_projector_roi(*size, raster_size)
+            x0, y0, roi_w, roi_h = roi
+            # With identity camera matrices the map is dst(u, v) -> inv(R) @ (u, v, 1);
+            # translating the output by -ROI origin makes (u, v) ROI-local
+            shift = np.array([[1.0, 0.0, -x0], [0.0, 1.0, -y0], [0.0, 0.0, 1.0]])
+            matrix = shift @ self.get_raster_warp_matrix(*raster_size)
+            if roi_w and roi_h:
+                map1, map2 = cv2.initUndistortRectifyMap(np.eye(3), None, matrix,
+                                                         np.eye(3), (roi_w, roi_h), cv2.CV_16SC2)
+            else:
+                map1 = map2 = None
+            self._remap_cache = (key, roi, map1, map2)
+        return self._remap_cache[1:]
+
     def _recompute_warp_matrix(self) -> None:
         """Recompute perspective warp matrix using current state."""
         if self.source_points is None or self.destination_points is None:
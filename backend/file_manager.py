@@ -24,6 +24,8 @@ class FileManager:
             upload_dir = os.path.join(base_dir, 'uploads')
         self.upload_dir = upload_dir
         os.makedirs(self.upload_dir, exist_ok=True)
+        # Contents of files uploaded through this manager, so renders can skip disk I/O
+        self._upload_index: Dict[str, bytes] = {}
     
     def is_allowed_file(self, filename: str) -> bool:
         """Check if file extension is allowed."""
@@ -64,8 +66,11 @@ class FileManager:
         filepath = os.path.join(self.upload_dir, filename)
         file.save(filepath)
         
+        with open(filepath, 'rb') as f:
+            self._upload_index[filename] = f.read()
+        
         # Get file info
-        file_size = os.path.getsize(filepath)
+        file_size = len(self._upload_index[filename])
         file_ext = filename.rsplit('.', 1)[1].lower()
         
         return {
@@ -77,8 +82,13 @@ class FileManager:
             "url": f"/uploads/{filename}"
         }
     
+    def get_indexed_upload(self, filename: str) -> Optional[bytes]:
+        """Get the contents of a file uploaded in this session, or None if not indexed."""
+        return self._upload_index.get(filename)
+    
     def delete_file(self, filename: str) -> bool:
         """Delete a file."""
+        self._upload_index.pop(filename, None)
         try:
             filepath = os.path.join(self.upload_dir, filename)
             if os.path.exists(filepath):
@@ -257,6 +267,7 @@ class FileManager:
                 if os.path.isfile(filepath):
                     file_time = os.path.getmtime(filepath)
                     if file_time < cutoff_time:
+                        self._upload_index.pop(filename, None)
                         os.remove(filepath)
                         cleaned_count += 1
         except Exception as e:
@@ -3,26 +3,62 @@ Main Flask server with WebSocket support for the press projector system.
 Handles HTTP requests and real-time communication between control and projector views.
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
 import sys
 import json
 from typing import Dict, Any, Optional
 from enum import Enum
-import base64
 import numpy as np
 import cv2
-import cairosvg
-from threading import Timer, Lock
+from cairosvg.parser import Tree as SvgTree
+from cairosvg.surface import PNGSurface
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 import re
 import logging
+import logging.handlers
+import queue
+import atexit
+import struct
+import hashlib
+import functools
+from html import escape as _html_escape
+import mmap
+import time
+import types
 from pathlib import Path
+from collections import OrderedDict
+
+try:
+    import xxhash
+except ImportError:  # optional: fall back to hashlib for layout fingerprints
+    xxhash = None
+
+try:
+    import pybase64 as base64  # SIMD codec, API-compatible with stdlib base64
+    b64encode_str = base64.b64encode_as_string  # encodes straight to str, no bytes copy
+except ImportError:
+    import base64
+
+    def b64encode_str(data) -> str:
+        return base64.b64encode(data).decode('ascii')
+
+try:
+    import resvg_py
+except ImportError:  # optional: rasterize with cairosvg only
+    resvg_py = None
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to stdlib json for Socket.IO packets
+    orjson = None
 
 from database import FileBasedDB
 from calibration import Calibrator
 from file_manager import FileManager
-import types
 
 
 # Initialize Flask app
@@ -31,9 +67,42 @@ app = Flask(__name__,
             static_url_path='/static',
             template_folder='../frontend/templates')
 app.config['SECRET_KEY'] = 'press_projector_secret_key_2024'
+# Bicubic projector warp for debugging; bilinear (SIMD fast path) is visually equivalent
+app.config['HIGH_QUALITY_WARP'] = False
+# Rasterize press scenes at this fraction of the raw press resolution (the warp scales back up)
+app.config['RASTER_SCALE'] = 1.0
+# Write debug SVGs (also on with DEBUG logging) / rendered frames to debug/renders (off the render path)
+app.config['DEBUG_SAVE_SVG'] = False
+app.config['DEBUG_WRITE_FRAMES'] = False
+
+# JSON module for Socket.IO packets: orjson when available (python-socketio only needs dumps/loads)
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    socketio_json = types.SimpleNamespace(
+        dumps=lambda obj, *args, **kwargs: orjson.dumps(obj, option=_ORJSON_OPTIONS).decode('utf-8'),
+        loads=lambda s, *args, **kwargs: orjson.loads(s)
+    )
+
+    class OrjsonProvider(JSONProvider):
+        """Flask JSON provider backed by orjson; jsonify() responses skip the str round-trip."""
+
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode('utf-8')
+
+        def loads(self, s, **kwargs: Any) -> Any:
+            return orjson.loads(s)
+
+        def response(self, *args: Any, **kwargs: Any):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(orjson.dumps(obj, option=_ORJSON_OPTIONS),
+                                            mimetype='application/json')
+
+    app.json = OrjsonProvider(app)
+else:
+    socketio_json = json
 
 # Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", json=socketio_json)
 
 # Configure logging to both file and console
 os.makedirs('debug', exist_ok=True)
@@ -83,17 +152,23 @@ console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(ColorFormatter(log_format, console_handler.stream))
 
+# Loggers only enqueue records; a listener thread does the formatting and the file/console writes
+log_queue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                              respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # drain queued records on exit
+
 # Add handlers to root logger
-root_logger.addHandler(file_handler)
-root_logger.addHandler(console_handler)
+root_logger.addHandler(queue_handler)
 
 # Also configure Flask's logger
 flask_logger = logging.getLogger('werkzeug')
 flask_logger.setLevel(logging.INFO)
 for handler in flask_logger.handlers[:]:
     flask_logger.removeHandler(handler)
-flask_logger.addHandler(file_handler)
-flask_logger.addHandler(console_handler)
+flask_logger.addHandler(queue_handler)
 
 logger = logging.getLogger(__name__)
 logger.info("Logging configured - file and console output enabled")
@@ -113,6 +188,25 @@ _layout_state = {
     'elements': []
 }
 _show_boundary_pattern = False
+# Bumped by every layout mutator; lets broadcasts omit an unchanged layout dict
+_layout_version = 0
+_last_sent_layout_version = -1
+_last_sent_layout_fingerprint = None
+# Bumped by anything that changes broadcast SVGs; periodic ticks are skipped while it is unchanged
+_state_generation = 0
+_last_broadcast_key = None
+# Generated press SVGs: (press_id, operation_mode) -> (key, layout source, svg)
+_svg_cache = {}
+
+# href/xlink:href attributes pointing at /uploads (relative or absolute URL)
+_UPLOAD_HREF_RE = re.compile(r'(xlink:href|href)="(?:(?:https?://[^"]+)?/)?uploads/([^"]+)"')
+# <image> tags and their attributes, for upload image height fixing
+_IMAGE_TAG_RE = re.compile(r'<image\b[^>]*?>')
+_HREF_IN_TAG_RE = re.compile(r'(?:xlink:href|href)="([^"]+)"')
+_WIDTH_ATTR_RE = re.compile(r'\bwidth="([0-9]+(?:\.[0-9]+)?)"')
+_HEIGHT_ATTR_RE = re.compile(r'\bheight="[0-9]+(?:\.[0-9]+)?"')
+_HEIGHT_PRESENT_RE = re.compile(r'\bheight="')
+_TAG_END_RE = re.compile(r'/?>$')
 
 # Operation mode enumeration
 class OperationMode(str, Enum):
@@ -120,6 +214,9 @@ class OperationMode(str, Enum):
     PRODUCTION = 'production'
 
 
+# Supported press IDs
+_PRESS_IDS = ('press1', 'press2')
+
 # Operation mode state - scenes loaded per press
 _operation_state = {
     'press1': {'scene_name': None, 'layout_data': None},
@@ -130,7 +227,7 @@ _operation_state = {
 def _determine_operation_mode_from_state() -> OperationMode:
     operation_mode_active = any(
         _operation_state.get(press_id, {}).get('layout_data')
-        for press_id in ['press1', 'press2']
+        for press_id in _PRESS_IDS
     )
     return OperationMode.PRODUCTION if operation_mode_active else OperationMode.SCENE_SETUP
 
@@ -159,6 +256,7 @@ def set_active_press(press_id: str) -> bool:
     global _active_press
     if press_id in _press_calibrators:
         _active_press = press_id
+        _bump_state_generation()
         return True
     return False
 
@@ -168,10 +266,11 @@ def get_calibrator(press_id: str = None) -> Calibrator:
         press_id = _active_press
     return _press_calibrators.get(press_id, _press_calibrators['press1'])
 
-def load_press_calibration(press_id: str) -> bool:
-    """Load calibration data for a specific press."""
+def load_press_calibration(press_id: str, calibration_data: Optional[Dict[str, Any]] = None) -> bool:
+    """Load calibration data for a specific press (read from the DB unless already given)."""
     try:
-        calibration_data = db.load_press_calibration(press_id)
+        if calibration_data is None:
+            calibration_data = db.load_press_calibration(press_id)
         if calibration_data:
             calibrator = get_calibrator(press_id)
             return calibrator.load_calibration_data(calibration_data)
@@ -180,98 +279,179 @@ def load_press_calibration(press_id: str) -> bool:
         logger.exception("Error loading calibration for press %s", press_id)
         return False
 
+def _bump_layout_version():
+    global _layout_version
+    _layout_version += 1
+    _bump_state_generation()
+
+def _bump_state_generation():
+    """Mark layout, operation or press state as changed so the next periodic broadcast runs."""
+    global _state_generation
+    _state_generation += 1
+
+def _layout_fingerprint() -> int:
+    """Fast content fingerprint of the layout state (orientation, center lines, elements)."""
+    h = xxhash.xxh3_64() if xxhash is not None else hashlib.blake2b(digest_size=8)
+    h.update(struct.pack('d', _layout_state['object_orientation']))
+    h.update(repr(sorted(_layout_state['center_lines'].items())).encode())
+    for el in _layout_state['elements']:
+        h.update(repr(sorted(el.items())).encode())
+    return h.intdigest() if xxhash is not None else int.from_bytes(h.digest(), 'little')
+
 def pj_set_object_orientation(angle_degrees: float):
-    _layout_state['object_orientation'] = float(angle_degrees or 0)
+    angle = float(angle_degrees or 0)
+    if angle != _layout_state['object_orientation']:
+        _layout_state['object_orientation'] = angle
+        _bump_layout_version()
 
 def pj_set_center_lines(horizontal_y=None, vertical_x=None):
-    if horizontal_y is not None:
-        _layout_state['center_lines']['horizontal'] = horizontal_y
-    if vertical_x is not None:
-        _layout_state['center_lines']['vertical'] = vertical_x
+    center_lines = _layout_state['center_lines']
+    changed = False
+    if horizontal_y is not None and horizontal_y != center_lines['horizontal']:
+        center_lines['horizontal'] = horizontal_y
+        changed = True
+    if vertical_x is not None and vertical_x != center_lines['vertical']:
+        center_lines['vertical'] = vertical_x
+        changed = True
+    if changed:
+        _bump_layout_version()
 
 def pj_clear_layout():
     # Only clear elements; preserve center lines and object orientation
     _layout_state['elements'] = []
+    _bump_layout_version()
 
 def pj_add_element(element_type: str, element_data: Dict[str, Any]):
     ed = dict(element_data)
     ed['type'] = element_type
     _layout_state['elements'].append(ed)
+    _bump_layout_version()
+
+def pj_set_elements(elements) -> bool:
+    """Replace the element list, keeping unchanged element dicts and the layout version if nothing changed.
+
+    Returns True if the elements changed.
+    """
+    current = _layout_state['elements']
+    updated = []
+    changed = len(elements) != len(current)
+    for i, element in enumerate(elements):
+        ed = dict(element)
+        ed['type'] = element['type']
+        if i < len(current) and current[i] == ed:
+            updated.append(current[i])
+        else:
+            updated.append(ed)
+            changed = True
+    if changed:
+        _layout_state['elements'] = updated
+        _bump_layout_version()
+    return changed
 
 def pj_get_layout_data() -> Dict[str, Any]:
-    return json.loads(json.dumps(_layout_state))
+    # Structural copy: element dicts are copied on add and never edited in place,
+    # so callers only need their own containers (no JSON round-trip)
+    return {
+        'object_orientation': _layout_state['object_orientation'],
+        'center_lines': dict(_layout_state['center_lines']),
+        'elements': [dict(el) for el in _layout_state['elements']]
+    }
 
 def pj_set_boundary_pattern_visibility(visible: bool):
     global _show_boundary_pattern
     _show_boundary_pattern = bool(visible)
+    _bump_state_generation()
 
-def _svg_center_lines(width_mm: float, height_mm: float) -> str:
-    """Generate center lines in press space (mm)."""
-    lines = []
+def _svg_center_lines(center_lines: Dict[str, Any], width_mm: float, height_mm: float, out: list) -> None:
+    """Append the given center lines in press space (mm) to the out fragment list."""
     try:
-        y_mm = _layout_state['center_lines']['horizontal']
+        y_mm = center_lines.get('horizontal')
         if y_mm is not None:
-            lines.append(f'<line x1="0" y1="{y_mm}" x2="{width_mm}" y2="{y_mm}" class="center-line"/>')
+            out.append(f'<line x1="0" y1="{y_mm}" x2="{width_mm}" y2="{y_mm}" class="center-line"/>')
     except Exception as e:
         logger.exception("center line H err")
     try:
-        x_mm = _layout_state['center_lines']['vertical']
+        x_mm = center_lines.get('vertical')
         if x_mm is not None:
-            lines.append(f'<line x1="{x_mm}" y1="0" x2="{x_mm}" y2="{height_mm}" class="center-line"/>')
+            out.append(f'<line x1="{x_mm}" y1="0" x2="{x_mm}" y2="{height_mm}" class="center-line"/>')
     except Exception as e:
         logger.exception("center line V err")
-    return '\n'.join(lines)
-
-def _svg_element(el: Dict[str, Any]) -> str:
-    """Generate SVG element in press space (mm coordinates)."""
-    t = el.get('type')
-    if t == 'rectangle':
-        x_mm, y_mm = (el.get('position') or [0,0])
-        w_mm = el.get('width', 10)
-        h_mm = el.get('height', 10)
-        rot = el.get('rotation', 0)
-        color = el.get('color', '#00ffff')
-        if rot:
-            cx = x_mm + w_mm/2; cy = y_mm + h_mm/2
-            return f'<g transform="rotate({rot} {cx} {cy})"><rect x="{x_mm}" y="{y_mm}" width="{w_mm}" height="{h_mm}" class="element-shape" stroke="{color}" fill="none"/></g>'
-        return f'<rect x="{x_mm}" y="{y_mm}" width="{w_mm}" height="{h_mm}" class="element-shape" stroke="{color}" fill="none"/>'
-    if t == 'circle':
-        x_mm, y_mm = (el.get('position') or [0,0])
-        r_mm = el.get('radius', 5)
-        return f'<circle cx="{x_mm}" cy="{y_mm}" r="{r_mm}" class="element-shape" fill="none"/>'
-    if t == 'text':
-        x_mm, y_mm = (el.get('position') or [0,0])
-        fs = el.get('font_size', 10)
-        color = el.get('color', '#0ff')
-        rot = el.get('rotation', 0)
-        txt = (el.get('text') or '').replace('&','&amp;')
-        baseline_y = y_mm
-        text_attrs = f'x="{x_mm}" y="{baseline_y}" fill="{color}" font-size="{fs}" font-family="Arial, sans-serif" alignment-baseline="hanging"'
-        if rot:
-            return f'<g transform="rotate({rot} {x_mm} {baseline_y})"><text {text_attrs}>{txt}</text></g>'
-        return f'<text {text_attrs}>{txt}</text>'
-    if t == 'image':
-        x_mm, y_mm = (el.get('position') or [0,0])
-        w_mm = el.get('width', 20)
-        rot = el.get('rotation', 0)
-        url = el.get('image_url', '')
-        # Determine image aspect ratio if possible
+
+# Element SVG templates (press space, mm); %-formatted so the constant parts are parsed once
+_ROTATE_TMPL = '<g transform="rotate(%s %s %s)">%s</g>'
+_RECT_TMPL = '<rect x="%s" y="%s" width="%s" height="%s" class="element-shape" stroke="%s" fill="none"/>'
+_CIRCLE_TMPL = '<circle cx="%s" cy="%s" r="%s" class="element-shape" fill="none"/>'
+_TEXT_TMPL = ('<text x="%s" y="%s" fill="%s" font-size="%s" font-family="Arial, sans-serif" '
+              'alignment-baseline="hanging">%s</text>')
+_IMAGE_TMPL = '<image x="%s" y="%s" width="%s" height="%s" xlink:href="%s"/>'
+_LINE_TMPL = '<line x1="%s" y1="%s" x2="%s" y2="%s" class="element-shape"/>'
+
+def _svg_rectangle(el: Dict[str, Any]) -> str:
+    g = el.get
+    x_mm, y_mm = (g('position') or [0,0])
+    w_mm = g('width', 10)
+    h_mm = g('height', 10)
+    rot = g('rotation', 0)
+    rect = _RECT_TMPL % (x_mm, y_mm, w_mm, h_mm, g('color', '#00ffff'))
+    if rot:
+        return _ROTATE_TMPL % (rot, x_mm + w_mm/2, y_mm + h_mm/2, rect)
+    return rect
+
+def _svg_circle(el: Dict[str, Any]) -> str:
+    g = el.get
+    x_mm, y_mm = (g('position') or [0,0])
+    return _CIRCLE_TMPL % (x_mm, y_mm, g('radius', 5))
+
+def _svg_text(el: Dict[str, Any]) -> str:
+    g = el.get
+    x_mm, y_mm = (g('position') or [0,0])
+    rot = g('rotation', 0)
+    # Text content only needs &, < and > escaped; html.escape's C replaces beat str.translate
+    txt = _html_escape(g('text') or '', quote=False)
+    text = _TEXT_TMPL % (x_mm, y_mm, g('color', '#0ff'), g('font_size', 10), txt)
+    if rot:
+        return _ROTATE_TMPL % (rot, x_mm, y_mm, text)
+    return text
+
+def _svg_image(el: Dict[str, Any]) -> str:
+    g = el.get
+    x_mm, y_mm = (g('position') or [0,0])
+    w_mm = g('width', 20)
+    rot = g('rotation', 0)
+    url = g('image_url', '')
+    # Determine image aspect ratio if possible
+    h_mm = w_mm
+    try:
+        aspect = get_image_aspect_ratio_from_url(url)
+        if aspect and aspect > 0:
+            h_mm = float(w_mm) * float(aspect)
+    except Exception as e:
+        logger.exception("Failed to compute image aspect ratio for %s", url)
         h_mm = w_mm
-        try:
-            aspect = get_image_aspect_ratio_from_url(url)
-            if aspect and aspect > 0:
-                h_mm = float(w_mm) * float(aspect)
-        except Exception as e:
-            logger.exception("Failed to compute image aspect ratio for %s", url)
-            h_mm = w_mm
-        if rot:
-            cx = x_mm + w_mm/2; cy = y_mm + h_mm/2
-            return f'<g transform="rotate({rot} {cx} {cy})"><image x="{x_mm}" y="{y_mm}" width="{w_mm}" height="{h_mm}" xlink:href="{url}"/></g>'
-        return f'<image x="{x_mm}" y="{y_mm}" width="{w_mm}" height="{h_mm}" xlink:href="{url}"/>'
-    if t == 'line':
-        (x1_mm,y1_mm) = (el.get('start') or [0,0]); (x2_mm,y2_mm) = (el.get('end') or [0,0])
-        return f'<line x1="{x1_mm}" y1="{y1_mm}" x2="{x2_mm}" y2="{y2_mm}" class="element-shape"/>'
-    return ''
+    image = _IMAGE_TMPL % (x_mm, y_mm, w_mm, h_mm, url)
+    if rot:
+        return _ROTATE_TMPL % (rot, x_mm + w_mm/2, y_mm + h_mm/2, image)
+    return image
+
+def _svg_line(el: Dict[str, Any]) -> str:
+    g = el.get
+    (x1_mm,y1_mm) = (g('start') or [0,0]); (x2_mm,y2_mm) = (g('end') or [0,0])
+    return _LINE_TMPL % (x1_mm, y1_mm, x2_mm, y2_mm)
+
+# Element type -> SVG fragment renderer
+_SVG_RENDERERS = {
+    'rectangle': _svg_rectangle,
+    'circle': _svg_circle,
+    'text': _svg_text,
+    'image': _svg_image,
+    'line': _svg_line,
+}
+
+def _svg_element(el: Dict[str, Any], out: list) -> None:
+    """Append an SVG element in press space (mm coordinates) to the out fragment list."""
+    render = _SVG_RENDERERS.get(el.get('type'))
+    if render is not None:
+        out.append(render(el))
 
 def pj_generate_svg(width: int = 1920,
                     height: int = 1080,
@@ -291,7 +471,7 @@ def pj_generate_svg(width: int = 1920,
         # Try to load calibration if not already loaded
         load_press_calibration(press_id)
         if not calibrator.is_calibrated():
-            logger.warning(f"Calibration not available for {press_id} when generating SVG")
+            logger.warning("Calibration not available for %s when generating SVG", press_id)
             return f'<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg"><rect width="100%" height="100%" fill="#222"/><text x="50%" y="50%" fill="#fff" text-anchor="middle">Calibration required</text></svg>'
     
     # Get press dimensions in mm
@@ -303,6 +483,19 @@ def pj_generate_svg(width: int = 1920,
     if operation_mode is OperationMode.PRODUCTION and press_id:
         op_layout = _operation_state.get(press_id, {}).get('layout_data')
     layout_src = op_layout or _layout_state
+
+    # Layout mutators bump _layout_version and operation layouts are replaced, never edited,
+    # so an unchanged version/source/press size means the previous SVG is still valid.
+    # Operation layouts do not depend on _layout_version: edits to the setup layout keep them cached.
+    # Image heights come from the referenced uploads, so their stat is part of the key too
+    layout_version = _layout_version if layout_src is _layout_state else None
+    upload_names = (extract_upload_filename(el.get('image_url'))
+                    for el in (layout_src.get('elements') or []) if el.get('image_url'))
+    cache_key = (layout_version, _show_boundary_pattern, press_width_mm, press_height_mm,
+                 _upload_stamps(name for name in upload_names if name))
+    cached = _svg_cache.get((press_id, operation_mode))
+    if cached is not None and cached[0] == cache_key and cached[1] is layout_src:
+        return cached[2]
     
     parts = []
     rot = layout_src.get('object_orientation', 0.0)
@@ -312,17 +505,10 @@ def pj_generate_svg(width: int = 1920,
     if _show_boundary_pattern:
         parts.append(f'<rect x="0" y="0" width="{press_width_mm}" height="{press_height_mm}" class="boundary"/>')
     # Render center lines from the chosen layout source
-    try:
-        prev_center = _layout_state.get('center_lines')
-        _layout_state['center_lines'] = (layout_src.get('center_lines') or {'horizontal': None, 'vertical': None})
-        parts.append(_svg_center_lines(press_width_mm, press_height_mm))
-    finally:
-        _layout_state['center_lines'] = prev_center
+    _svg_center_lines(layout_src.get('center_lines') or {}, press_width_mm, press_height_mm, parts)
     
     for el in (layout_src.get('elements') or []):
-        svg_el = _svg_element(el)
-        if svg_el:
-            parts.append(svg_el)
+        _svg_element(el, parts)
     if rot:
         parts.append('</g>')
     styles = (
@@ -330,9 +516,12 @@ def pj_generate_svg(width: int = 1920,
         '.boundary{stroke:#ff0;stroke-width:4;fill:rgba(255,255,0,0.2)}'
         '.element-shape{stroke:#0ff;stroke-width:2;fill:none}'
     )
-    body = '\n'.join([p for p in parts if p])
+    # Single join over every fragment; whitespace between tags is not needed
+    body = ''.join(parts)
     # SVG viewBox and dimensions in mm
-    return f'<?xml version="1.0" encoding="UTF-8"?>\n<svg width="{press_width_mm}mm" height="{press_height_mm}mm" viewBox="0 0 {press_width_mm} {press_height_mm}" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"><defs><style>{styles}</style></defs>{body}</svg>'
+    svg = f'<?xml version="1.0" encoding="UTF-8"?>\n<svg width="{press_width_mm}mm" height="{press_height_mm}mm" viewBox="0 0 {press_width_mm} {press_height_mm}" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"><defs><style>{styles}</style></defs>{body}</svg>'
+    _svg_cache[(press_id, operation_mode)] = (cache_key, layout_src, svg)
+    return svg
 
 # Create a simple namespace to keep existing call sites
 projector = types.SimpleNamespace(
@@ -340,6 +529,7 @@ projector = types.SimpleNamespace(
     set_center_lines=pj_set_center_lines,
     clear_layout=pj_clear_layout,
     add_element=pj_add_element,
+    set_elements=pj_set_elements,
     get_layout_data=pj_get_layout_data,
     set_boundary_pattern_visibility=pj_set_boundary_pattern_visibility,
     generate_svg=pj_generate_svg
@@ -351,6 +541,8 @@ connected_clients = {
     'control': None,
     'projector': None
 }
+# Reverse index of connected_clients: sid -> rooms it currently holds
+_sid_rooms = {}
 
 # Projector state/config
 projector_resolution = {
@@ -361,48 +553,122 @@ projector_resolution = {
 # Debug flag: bypass warp when True (debug preview)
 debug_bypass_warp = False
 
-# Periodic update timer
-periodic_update_timer = None
-
-# Render coalescing state: keep only latest payload
-_render_lock = Lock()
-_render_worker_running = False
-_latest_render_payload = None
+# Periodic layout broadcast: runs as one background task until its stop event is set
+PERIODIC_UPDATE_INTERVAL = 2.0  # seconds
+_periodic_stop = None
 
+# Layout broadcast coalescing: bursts of layout updates produce one SVG build per interval
+LAYOUT_BROADCAST_INTERVAL = 0.033  # seconds (~30 Hz)
+_broadcast_lock = Lock()
+_pending_broadcast = False
+# Layout emission in flight (periodic tick or flush); emitters requested meanwhile run once after it
+_is_broadcasting = False
+_pending_layout_emits = {}  # emitter -> None, an insertion-ordered set
 
-def encode_filename_to_data_url(filename: str):
-    """Encode an uploaded image filename to a base64 data URL if it exists."""
-    filepath = os.path.join(file_manager.upload_dir, filename)
-    if os.path.exists(filepath):
+# Render coalescing state: single-slot queue (newest payload wins) drained by one worker
+_render_lock = Lock()
+_render_queue = None  # created on first render_svg with the server's async-mode queue class
+_encode_queue = None  # render -> encode hand-off (newest wins), created alongside _render_queue
+# Queue wait + render time above which a frame is reported as stalled (seconds)
+RENDER_STALL_WARN = 0.25
+
+# Recent rasters: (blake2b(svg), width, height) -> read-only BGR array, least recently used first
+RASTER_CACHE_SIZE = 8
+_raster_cache = OrderedDict()
+_raster_cache_lock = Lock()
+
+# zlib level for server-side PNG encodes (boundary pattern, debug frames); 1 + RLE is ~10x faster than the default
+PNG_COMPRESS_LEVEL = 1
+_PNG_ENCODE_PARAMS = [int(cv2.IMWRITE_PNG_COMPRESSION), PNG_COMPRESS_LEVEL,
+                      int(cv2.IMWRITE_PNG_STRATEGY), int(cv2.IMWRITE_PNG_STRATEGY_RLE)]
+
+# projector_frame wire format: 'jpeg' (fast, small; frames are opaque) or 'png' (lossless)
+PROJECTOR_FRAME_FORMAT = 'jpeg'
+JPEG_QUALITY = 85
+_JPEG_ENCODE_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY,
+                       int(cv2.IMWRITE_JPEG_OPTIMIZE), 0, int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0]
+
+# Single worker for debug file writes so they never block rendering
+_debug_io_pool = ThreadPoolExecutor(max_workers=1)
+# One worker per press so all calibrations are read from the DB concurrently
+_db_pool = ThreadPoolExecutor(max_workers=len(_PRESS_IDS))
+
+
+def _load_all_press_calibrations() -> Dict[str, Any]:
+    """Read every press calibration from the DB concurrently; press_id -> data (None if missing)."""
+    futures = {press_id: _db_pool.submit(db.load_press_calibration, press_id) for press_id in _PRESS_IDS}
+    return {press_id: future.result() for press_id, future in futures.items()}
+
+# MIME types of uploadable images, keyed by lowercase extension (no dot)
+_MIME_TYPES = types.MappingProxyType({
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'svg': 'image/svg+xml'
+})
+
+# Upload data URLs: filename -> ((mtime_ns, size), mime_type, data_url)
+_data_url_cache = {}
+# Upload image aspect ratios (height/width): path -> ((mtime_ns, size), aspect)
+_aspect_cache = {}
+# Recent process_upload_images results: (input SVG, upload stamps) -> output UTF-8 bytes, least recently used first.
+# Sized for both presses' operation-mode SVGs plus a few drag states; cleared when an upload changes
+PROCESSED_SVG_CACHE_SIZE = 8
+_processed_svg_cache = OrderedDict()
+_processed_svg_lock = Lock()
+
+# Warped boundary pattern PNGs (base64), keyed by press/calibration/resolution, least recently
+# used first. Every calibration drag position is a new key, so only the last few are kept
+PATTERN_PNG_CACHE_SIZE = 4
+_pattern_png_cache = OrderedDict()
+_pattern_png_lock = Lock()
+
+
+def encode_filename_to_data_url(filename: str, default_mime: str = 'image/png'):
+    """Encode an uploaded file to a base64 data URL if it exists (cached per file stat).
+
+    default_mime is used for extensions missing from _MIME_TYPES.
+    """
+    mime_type = _MIME_TYPES.get(os.path.splitext(filename)[1][1:].lower(), default_mime)
+    cached = _data_url_cache.get(filename)
+    if cached is not None and cached[1] != mime_type:
+        cached = None
+    # Files uploaded this session are served from memory; the upload route drops their cached URL
+    img_data = file_manager.get_indexed_upload(filename)
+    if img_data is not None:
+        if cached is not None:
+            return cached[2]
+        stamp = None
+    else:
+        filepath = os.path.join(file_manager.upload_dir, filename)
         try:
-            with open(filepath, 'rb') as f:
-                img_data = f.read()
-            ext = filename.rsplit('.', 1)[-1].lower()
-            mime_types = {
-                'png': 'image/png',
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'svg': 'image/svg+xml'
-            }
-            mime_type = mime_types.get(ext, 'image/png')
-            b64_data = base64.b64encode(img_data).decode('ascii')
-            return f'data:{mime_type};base64,{b64_data}'
-        except Exception as e:
-            print(f"Error encoding image {filename}: {e}")
+            st = os.stat(filepath)
+        except OSError:
             return None
-    return None
-
-def inline_upload_image_links(svg_str: str) -> str:
-    """Replace href/xlink:href that point to /uploads with data URLs."""
-    def repl(match):
-        attr = match.group(1)
-        filename = match.group(2)
-        data_url = encode_filename_to_data_url(filename)
-        return f'{attr}="{data_url}"' if data_url else match.group(0)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if cached is not None and cached[0] == stamp:
+            return cached[2]
+    try:
+        if img_data is not None:
+            b64_data = b64encode_str(img_data)
+        elif stamp[1] == 0:
+            b64_data = ''  # mmap cannot map empty files
+        else:
+            # Encode straight from the page cache instead of copying the file into a bytes object
+            with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                b64_data = b64encode_str(mm)
+        data_url = f'data:{mime_type};base64,{b64_data}'
+        _data_url_cache[filename] = (stamp, mime_type, data_url)
+        return data_url
+    except Exception as e:
+        print(f"Error encoding image {filename}: {e}")
+        return None
 
-    pattern = r'(xlink:href|href)="(?:(?:https?://[^\"]+)?/)?uploads/([^"]+)"'
-    return re.sub(pattern, repl, svg_str)
+def _inline_upload_href(match: re.Match) -> str:
+    data_url = encode_filename_to_data_url(match.group(2))
+    return f'{match.group(1)}="{data_url}"' if data_url else match.group(0)
 
+@functools.lru_cache(maxsize=256)
 def extract_upload_filename(url: str):
     """Extract filename from a URL that points to uploads, handling absolute/relative forms."""
     if not isinstance(url, str) or not url:
@@ -417,120 +683,380 @@ def extract_upload_filename(url: str):
         return url.split('uploads/', 1)[1]
     return None
 
+def _read_image_size(path: str):
+    """Read (width, height) from a PNG or JPEG header without decoding pixels.
+
+    Returns None when the format is not recognized or the header is malformed.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:2] == b'\xff\xd8':
+            # Walk JPEG segments up to the first start-of-frame marker
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                code = marker[1]
+                if code == 0xFF:  # fill byte
+                    f.seek(-1, os.SEEK_CUR)
+                    continue
+                if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+                    continue  # standalone markers carry no length
+                seg_len = f.read(2)
+                if len(seg_len) < 2:
+                    return None
+                length = struct.unpack('>H', seg_len)[0]
+                if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                    sof = f.read(5)
+                    if len(sof) < 5:
+                        return None
+                    height, width = struct.unpack('>HH', sof[1:5])
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    return None
+
 def get_image_aspect_ratio_from_url(url: str):
     """Return height/width aspect ratio for an uploaded image URL, or None if unavailable."""
     fname = extract_upload_filename(url)
     if not fname:
         return None
+    path = os.path.join(file_manager.upload_dir, fname)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _aspect_cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
     try:
-        path = os.path.join(file_manager.upload_dir, fname)
-        if os.path.exists(path):
+        size = _read_image_size(path)
+        if size is None:
+            # Unknown format: fall back to a full decode
             img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
-            if img is not None and img.shape[1] > 0:
-                return float(img.shape[0]) / float(img.shape[1])
+            if img is not None:
+                size = (img.shape[1], img.shape[0])
+        if size is not None and size[0] > 0:
+            aspect = float(size[1]) / float(size[0])
+            _aspect_cache[path] = (stamp, aspect)
+            return aspect
     except Exception as e:
         print(f"Failed to read image for aspect ratio {url}: {e}")
     return None
 
-def adjust_upload_image_heights(svg_str: str) -> str:
-    """Ensure <image> elements referencing uploads have height set by aspect ratio.
-    Uses element width and measured image aspect to compute height in the same units.
+def _fix_upload_image_height(tag: str, url: str) -> str:
+    """Set the height of one <image> tag from its width and the referenced upload's aspect ratio."""
+    aspect = get_image_aspect_ratio_from_url(url)
+    if not aspect or aspect <= 0:
+        return tag
+    # Find width value
+    w_m = _WIDTH_ATTR_RE.search(tag)
+    if not w_m:
+        return tag
+    try:
+        w_val = float(w_m.group(1))
+    except Exception:
+        return tag
+    h_val = w_val * float(aspect)
+    # Replace or add height attribute with computed value
+    if _HEIGHT_PRESENT_RE.search(tag):
+        tag = _HEIGHT_ATTR_RE.sub(f'height="{h_val}"', tag)
+    else:
+        # Insert before closing
+        tag = _TAG_END_RE.sub(f' height="{h_val}"\\g<0>', tag)
+    # Also fix rotation centers if present (optional: leave as-is; projector warping uses pixel image)
+    return tag
+
+def _process_upload_image_tag(match: re.Match) -> str:
+    tag = match.group(0)
+    href_m = _HREF_IN_TAG_RE.search(tag)
+    if not href_m:
+        return tag
+    tag = _fix_upload_image_height(tag, href_m.group(1))
+    # Inline within the (short) tag only; the full SVG is never rescanned
+    return _UPLOAD_HREF_RE.sub(_inline_upload_href, tag)
+
+def _upload_stamps(filenames) -> tuple:
+    """(filename, mtime_ns, size) per referenced upload, so caches notice files replaced on disk."""
+    stamps = []
+    for fname in filenames:
+        try:
+            st = os.stat(os.path.join(file_manager.upload_dir, fname))
+            stamps.append((fname, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append((fname, None, None))
+    return tuple(stamps)
+
+def _svg_upload_stamps(svg_str: str) -> tuple:
+    """Upload stamps of every /uploads reference in an SVG."""
+    return _upload_stamps(m.group(2) for m in _UPLOAD_HREF_RE.finditer(svg_str))
+
+def process_upload_images(svg_str: str) -> bytes:
+    """Fix upload image heights and inline them as data URLs; recent results are memoized.
+
+    Both fixes run in a single pass over the <image> tags. Returns the UTF-8 encoded SVG,
+    which is what the rasterizer consumes. Memoized per SVG and the stat of every upload
+    it references.
     """
-    def replace_image_tag(match: re.Match) -> str:
-        tag = match.group(0)
-        # Find href within this tag
-        href_m = re.search(r'(?:xlink:href|href)="([^"]+)"', tag)
-        if not href_m:
-            return tag
-        url = href_m.group(1)
-        aspect = get_image_aspect_ratio_from_url(url)
-        if not aspect or aspect <= 0:
-            return tag
-        # Find width value
-        w_m = re.search(r'\bwidth="([0-9]+(?:\.[0-9]+)?)"', tag)
-        if not w_m:
-            return tag
+    key = (svg_str, _svg_upload_stamps(svg_str))
+    with _processed_svg_lock:
+        svg_bytes = _processed_svg_cache.get(key)
+        if svg_bytes is not None:
+            _processed_svg_cache.move_to_end(key)
+            return svg_bytes
+    svg_bytes = _IMAGE_TAG_RE.sub(_process_upload_image_tag, svg_str).encode('utf-8')
+    with _processed_svg_lock:
+        _processed_svg_cache[key] = svg_bytes
+        while len(_processed_svg_cache) > PROCESSED_SVG_CACHE_SIZE:
+            _processed_svg_cache.popitem(last=False)
+    return svg_bytes
+
+def _rasterize_svg_bgr(svg_bytes: bytes, width: int, height: int) -> np.ndarray:
+    """Rasterize SVG bytes into a BGR array composited onto black.
+
+    Uses resvg when installed, falling back to cairosvg for SVGs it rejects.
+    """
+    if resvg_py is not None:
         try:
-            w_val = float(w_m.group(1))
-        except Exception:
-            return tag
-        h_val = w_val * float(aspect)
-        # Replace or add height attribute with computed value
-        if re.search(r'\bheight="', tag):
-            tag = re.sub(r'\bheight="[0-9]+(?:\.[0-9]+)?"', f'height="{h_val}"', tag)
-        else:
-            # Insert before closing
-            tag = re.sub(r'/?>$', f' height="{h_val}"\g<0>', tag)
-        # Also fix rotation centers if present (optional: leave as-is; projector warping uses pixel image)
-        return tag
-    # Only process <image ...> tags
-    return re.sub(r'<image\b[^>]*?>', replace_image_tag, svg_str)
+            return _rasterize_svg_bgr_resvg(svg_bytes, width, height)
+        except ValueError:
+            logger.warning("resvg could not render SVG; falling back to cairosvg", exc_info=True)
+    return _rasterize_svg_bgr_cairo(svg_bytes, width, height)
+
+def _rasterize_svg_bgr_resvg(svg_bytes: bytes, width: int, height: int) -> np.ndarray:
+    """Rasterize SVG bytes with resvg onto a black background."""
+    png = resvg_py.svg_to_bytes(svg_string=svg_bytes.decode('utf-8'), width=width, height=height,
+                                background='black')
+    img = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("resvg returned an undecodable image")
+    # resvg keeps the SVG aspect ratio; stretch like cairosvg when it differs from the target
+    if img.shape[:2] != (height, width):
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_LINEAR)
+    return img
+
+def _rasterize_svg_bgr_cairo(svg_bytes: bytes, width: int, height: int) -> np.ndarray:
+    """Rasterize SVG bytes with cairosvg into a BGR array composited onto black.
+
+    Reads cairo's ARGB32 image surface directly instead of going through a PNG
+    encode/decode. Cairo stores premultiplied BGRA on little-endian hosts, so the
+    color channels already equal the image composited over black.
+    """
+    surface = PNGSurface(SvgTree(bytestring=svg_bytes), None, 96,
+                         output_width=width, output_height=height)
+    image_surface = surface.cairo
+    image_surface.flush()
+    h, w = image_surface.get_height(), image_surface.get_width()
+    rows = np.frombuffer(image_surface.get_data(), dtype=np.uint8).reshape(h, image_surface.get_stride())
+    bgra = rows[:, :w * 4].reshape(h, w, 4)
+    # Drop alpha with OpenCV's SIMD channel copy (much faster than a strided NumPy slice copy)
+    return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+
+def rasterize_svg(svg_bytes: bytes, width: int, height: int) -> np.ndarray:
+    """Rasterize SVG bytes to a BGR array, reusing the result for recently seen SVGs.
+
+    The returned array is shared with the cache and marked read-only.
+    """
+    key = (hashlib.blake2b(svg_bytes, digest_size=16).digest(), width, height)
+    with _raster_cache_lock:
+        img = _raster_cache.get(key)
+        if img is not None:
+            _raster_cache.move_to_end(key)
+            return img
+    # Runs on the render threads, which is what keeps cairo off the Socket.IO handlers
+    img = _rasterize_svg_bgr(svg_bytes, width, height)
+    img.flags.writeable = False
+    with _raster_cache_lock:
+        _raster_cache[key] = img
+        while len(_raster_cache) > RASTER_CACHE_SIZE:
+            _raster_cache.popitem(last=False)
+    return img
+
+def _write_debug_png(image: np.ndarray, filepath: str) -> None:
+    """Write a debug PNG with fast compression (runs on the debug I/O worker)."""
+    try:
+        ok = cv2.imwrite(filepath, image, _PNG_ENCODE_PARAMS)
+        if not ok:
+            logger.warning("cv2.imwrite returned False for %s", filepath)
+    except Exception:
+        logger.exception("Failed to save debug PNG '%s'", filepath)
 
 def save_debug_png(image: np.ndarray, filename: str) -> str:
     """Save a PNG image to debug/renders with the given filename.
 
+    Disabled unless app.config['DEBUG_WRITE_FRAMES'] is set; the encode and
+    write are queued on the debug I/O worker so renders never wait on disk.
+
     Args:
         image: Image array (BGR or BGRA) to write as PNG
         filename: Target filename, e.g. 'latest.png'
 
     Returns:
-        The file path on success, or None if saving failed.
+        The file path being written, or None if saving is disabled or failed.
     """
+    if not app.config.get('DEBUG_WRITE_FRAMES'):
+        return None
     try:
         debug_dir = os.path.join('debug', 'renders')
         os.makedirs(debug_dir, exist_ok=True)
         filepath = os.path.join(debug_dir, Path(filename).with_suffix('.png'))
-        ok = cv2.imwrite(filepath, image)
-        if not ok:
-            logger.warning("cv2.imwrite returned False for %s", filepath)
-            return None
+        _debug_io_pool.submit(_write_debug_png, image, filepath)
         return filepath
 
     except Exception:
         logger.exception("Failed to save debug PNG '%s'", filename)
         return None
 
-def save_debug_svg(svg_content: str, filename: str = 'latest.svg') -> str:
+def _write_debug_svg(svg_content, filepath: str) -> None:
+    """Write an SVG (str or UTF-8 bytes) as-is to filepath (runs on the debug I/O worker)."""
+    try:
+        if isinstance(svg_content, str):
+            svg_content = svg_content.encode('utf-8')
+        with open(filepath, 'wb') as f:
+            f.write(svg_content)
+    except Exception as e:
+        logger.exception("Failed to save SVG to disk: %s", e)
+
+def save_debug_svg(svg_content, filename: str = 'latest.svg') -> str:
     """Save an SVG to debug/renders with the given filename.
 
+    Disabled unless app.config['DEBUG_SAVE_SVG'] is set or debug logging is on;
+    the raw write is queued on the debug I/O worker so renders never wait on it.
+
     Args:
-        svg_content: SVG content to save
+        svg_content: SVG content to save (str or UTF-8 bytes)
         filename: Target filename, e.g. 'latest.svg'
 
     Returns:
-        The file path on success, or None if saving failed.
+        The file path being written, or None if saving is disabled or failed.
     """
+    if not (app.config.get('DEBUG_SAVE_SVG') or logger.isEnabledFor(logging.DEBUG)):
+        return None
     try:
-        import xml.dom.minidom
         debug_dir = os.path.join('debug', 'renders')
         os.makedirs(debug_dir, exist_ok=True)
         filepath = os.path.join(debug_dir, Path(filename).with_suffix('.svg'))
-
-        # Parse and pretty-print the SVG
-        dom = xml.dom.minidom.parseString(svg_content.encode('utf-8'))
-        pretty_svg = dom.toprettyxml(indent="  ", encoding=None)
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(pretty_svg)
-
+        _debug_io_pool.submit(_write_debug_svg, svg_content, filepath)
         return filepath
     except Exception as e:
         logger.exception("Failed to save SVG to disk: %s", e)
         return None
 
 
-def send_layout_update_to_control(layout_data: Dict[str, Any],
-                                  svg_content: str,
-                                  operation_mode: OperationMode = OperationMode.SCENE_SETUP) -> None:
-    socketio.emit('layout_updated', {
-        'layout': layout_data,
+def layout_update_payload(svg_content: str,
+                          operation_mode: OperationMode = OperationMode.SCENE_SETUP,
+                          force_layout: bool = False) -> Dict[str, Any]:
+    """Build a layout_updated payload; the layout dict is only included when its version changed.
+
+    force_layout always includes it, for a reply to a single client: the broadcast
+    "last sent" state is left untouched, so other clients still get the change.
+    """
+    global _last_sent_layout_version, _last_sent_layout_fingerprint
+    payload = {
+        'v': _layout_version,
         'svg': svg_content,
         'operation_mode': operation_mode.value
-    }, room='control')
+    }
+    if force_layout:
+        payload['layout'] = projector.get_layout_data()
+    elif _layout_version != _last_sent_layout_version:
+        # Mutators bump the version even for identical rewrites; compare content before resending
+        fingerprint = _layout_fingerprint()
+        if fingerprint != _last_sent_layout_fingerprint:
+            payload['layout'] = projector.get_layout_data()
+            _last_sent_layout_fingerprint = fingerprint
+        _last_sent_layout_version = _layout_version
+    return payload
+
+def _room_occupied(room: str) -> bool:
+    """True if at least one client is in the given room of the default namespace."""
+    return bool(socketio.server.manager.rooms.get('/', {}).get(room))
+
+def send_layout_update_to_control(svg_content: str,
+                                  operation_mode: OperationMode = OperationMode.SCENE_SETUP) -> None:
+    socketio.emit('layout_updated', layout_update_payload(svg_content, operation_mode), room='control')
+
+def schedule_layout_broadcast() -> None:
+    """Schedule one layout broadcast to control; calls within the interval are coalesced."""
+    global _pending_broadcast
+    with _broadcast_lock:
+        if _pending_broadcast:
+            return
+        _pending_broadcast = True
+    socketio.start_background_task(_flush_layout_broadcast, LAYOUT_BROADCAST_INTERVAL)
+
+def _flush_layout_broadcast(delay: float) -> None:
+    """Wait out the coalescing interval, then generate the SVG once and notify control."""
+    global _pending_broadcast
+    socketio.sleep(delay)
+    with _broadcast_lock:
+        _pending_broadcast = False
+    _run_layout_emit(_emit_layout_to_control)
+
+def _run_layout_emit(emit_layout) -> None:
+    """Run one layout emission at a time; each emitter requested during a run runs once after it."""
+    global _is_broadcasting
+    with _broadcast_lock:
+        if _is_broadcasting:
+            _pending_layout_emits[emit_layout] = None
+            return
+        _is_broadcasting = True
+    try:
+        emitters = [emit_layout]
+        while emitters:
+            for emitter in emitters:
+                emitter()
+            with _broadcast_lock:
+                emitters = list(_pending_layout_emits)
+                _pending_layout_emits.clear()
+    finally:
+        with _broadcast_lock:
+            _is_broadcasting = False
+
+def _layout_broadcast_key():
+    """Everything the periodic layout broadcast depends on."""
+    calibrator = get_calibrator()
+    return (_state_generation, _active_press, calibrator.press_width_mm, calibrator.press_height_mm,
+            calibrator.is_calibrated())
+
+def _emit_layout_to_control() -> None:
+    """Generate the scene-setup SVG and notify control."""
+    global _last_broadcast_key
+    if not _room_occupied('control'):
+        return
+    # Taken before generating, so a state change during the emit still triggers the next tick
+    key = _layout_broadcast_key()
+    try:
+        svg_content = projector.generate_svg()
+        try:
+            save_debug_svg(svg_content, 'layout_update_latest.svg')
+        except Exception:
+            pass
+        # Notify control UI only; projector consumes rasterized frames
+        send_layout_update_to_control(svg_content, OperationMode.SCENE_SETUP)
+        # In scene setup the periodic tick would send this same layout again
+        if _determine_operation_mode_from_state() is OperationMode.SCENE_SETUP:
+            _last_broadcast_key = key
+    except Exception:
+        logger.exception("Error flushing layout broadcast")
 
 def broadcast_layout_update():
-    """Broadcast current layout to all projectors."""
-    global periodic_update_timer
+    """Broadcast current layout to all projectors (coalesced with in-flight emissions)."""
+    _run_layout_emit(_broadcast_layout_once)
+
+def _broadcast_layout_once():
+    global _last_broadcast_key
+    # No control client to preview the layout: skip SVG generation entirely
+    if not _room_occupied('control'):
+        return
+    # Nothing the periodic SVG depends on changed since the last emit: skip generate + emit
+    key = _layout_broadcast_key()
+    if key == _last_broadcast_key:
+        return
+    _last_broadcast_key = key
     try:
         mode = _determine_operation_mode_from_state()
 
@@ -549,34 +1075,38 @@ def broadcast_layout_update():
             }, room='control')
         else:
             # Normal mode: send current layout
-            layout_data = projector.get_layout_data()
             svg_content = projector.generate_svg(operation_mode=mode)
             try:
                 save_debug_svg(svg_content, 'control_latest.svg')
             except Exception:
                 pass
-            send_layout_update_to_control(layout_data, svg_content, mode)
+            send_layout_update_to_control(svg_content, mode)
     except Exception as e:
         logger.exception("Error broadcasting layout update")
-    
-    # Schedule next update in 2 seconds
-    periodic_update_timer = Timer(2.0, broadcast_layout_update)
-    periodic_update_timer.start()
+
+def _periodic_update_loop(stop: Event) -> None:
+    """Broadcast the layout every PERIODIC_UPDATE_INTERVAL seconds until stop is set."""
+    while not stop.is_set():
+        socketio.sleep(PERIODIC_UPDATE_INTERVAL)
+        if stop.is_set():
+            break
+        broadcast_layout_update()
 
 def start_periodic_updates():
     """Start periodic updates to projector."""
-    global periodic_update_timer
-    if periodic_update_timer:
-        periodic_update_timer.cancel()
-    periodic_update_timer = Timer(2.0, broadcast_layout_update)
-    periodic_update_timer.start()
+    global _periodic_stop
+    if _periodic_stop is not None and not _periodic_stop.is_set():
+        return  # already running
+    # Each run gets its own stop event so a stopped loop can never be revived
+    _periodic_stop = Event()
+    socketio.start_background_task(_periodic_update_loop, _periodic_stop)
 
 def stop_periodic_updates():
     """Stop periodic updates."""
-    global periodic_update_timer
-    if periodic_update_timer:
-        periodic_update_timer.cancel()
-        periodic_update_timer = None
+    global _periodic_stop
+    if _periodic_stop is not None:
+        _periodic_stop.set()
+        _periodic_stop = None
 
 
 @app.route('/')
@@ -702,7 +1232,7 @@ def list_presses():
     try:
         presses = db.list_presses()
         # Ensure press1 and press2 are always available
-        all_presses = ['press1', 'press2']
+        all_presses = list(_PRESS_IDS)
         return jsonify({'presses': all_presses, 'configured': presses})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -715,7 +1245,7 @@ def create_press():
         data = request.get_json() or {}
         press_id = data.get('press_id', 'press2')
         
-        if press_id not in ['press1', 'press2']:
+        if press_id not in _PRESS_IDS:
             return jsonify({'error': f'Invalid press_id: {press_id}. Only press1 and press2 are supported.'}), 400
         
         # Check if press already exists
@@ -863,22 +1393,11 @@ def update_layout():
             print(f"[REST /api/layout] stored center_lines: {_layout_state['center_lines']}")
         
         if 'elements' in data:
-            # Clear existing elements and add new ones
-            projector.clear_layout()
-            for element in data['elements']:
-                projector.add_element(element['type'], element)
+            # Replace elements; an unchanged list leaves the layout version (and caches) intact
+            projector.set_elements(data['elements'])
         
-        # Generate and send updated SVG
-        svg_content = projector.generate_svg()
-        try:
-            save_debug_svg(svg_content, 'layout_update_latest.svg')
-        except Exception:
-            pass
-        # Notify control UI only; projector consumes rasterized frames
-        try:
-            send_layout_update_to_control(projector.get_layout_data(), svg_content, OperationMode.SCENE_SETUP)
-        except Exception:
-            pass
+        # Generate and send updated SVG (coalesced with other updates in this burst)
+        schedule_layout_broadcast()
         # Ensure calibration overlay is not shown during normal edits
         try:
             socketio.emit('stop_calibration', room='projector')
@@ -903,6 +1422,19 @@ def get_layout():
 # Removed unused /api/boundary-pattern endpoint (no callers in frontend)
 
 
+def _invalidate_upload_caches(filename: str) -> None:
+    """Drop everything derived from an upload that may have replaced a file of the same name."""
+    global _upload_generation
+    _upload_generation += 1
+    _data_url_cache.pop(filename, None)
+    # Processed SVGs may have inlined the previous file
+    with _processed_svg_lock:
+        _processed_svg_cache.clear()
+    # Generated SVGs carry image heights from the previous file's aspect ratio
+    _svg_cache.clear()
+    _bump_state_generation()
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Handle file uploads."""
@@ -915,6 +1447,7 @@ def upload_file():
             return jsonify({'error': 'No file selected'}), 400
         
         file_info = file_manager.save_uploaded_file(file)
+        _invalidate_upload_caches(file_info['filename'])
         return jsonify({'success': True, 'file': file_info})
         
     except Exception as e:
@@ -931,36 +1464,65 @@ def list_files():
         return jsonify({'error': str(e)}), 500
 
 
+# Raw read size for streamed base64; a multiple of 3 so no padding appears mid-stream
+_B64_STREAM_CHUNK = 48 * 1024
+
+
+def _b64_stream(filepath: str, mime_type: str):
+    """Yield a file as a base64 data URL in constant memory."""
+    yield ('data:%s;base64,' % mime_type).encode('ascii')
+    with open(filepath, 'rb') as fp:
+        while True:
+            chunk = fp.read(_B64_STREAM_CHUNK)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+
+
 @app.route('/api/files/<filename>/base64', methods=['GET'])
 def get_file_base64(filename):
-    """Get file as base64 encoded data URL."""
+    """Get file as base64 encoded data URL.
+
+    With ?stream=1 the data URL is streamed as text/plain instead of being
+    buffered into a JSON body (constant memory for large uploads).
+    """
     try:
         filepath = os.path.join(file_manager.upload_dir, filename)
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 404
         
-        # Read file and encode as base64
-        with open(filepath, 'rb') as f:
-            file_data = f.read()
-        
-        # Get file extension to determine MIME type
-        ext = filename.rsplit('.', 1)[-1].lower()
-        mime_types = {
-            'png': 'image/png',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'svg': 'image/svg+xml'
-        }
-        mime_type = mime_types.get(ext, 'application/octet-stream')
+        if request.args.get('stream') in ('1', 'true'):
+            mime_type = _MIME_TYPES.get(os.path.splitext(filename)[1][1:].lower(), 'application/octet-stream')
+            return app.response_class(stream_with_context(_b64_stream(filepath, mime_type)),
+                                      mimetype='text/plain')
         
-        b64_data = base64.b64encode(file_data).decode('ascii')
-        data_url = f'data:{mime_type};base64,{b64_data}'
+        # Shares the stat-keyed data URL cache with SVG image inlining
+        data_url = encode_filename_to_data_url(filename, default_mime='application/octet-stream')
+        if data_url is None:
+            return jsonify({'error': 'Failed to encode file'}), 500
         
         return jsonify({'data_url': data_url})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Element keys holding an [x, y] point in press space (mm)
+_POINT_KEYS = ('position', 'start', 'end')
+
+def _offset_element_points(elements, dx: float, dy: float) -> list:
+    """Copy elements with every [x, y] point (position/start/end) shifted by (dx, dy).
+
+    Only elements that carry a point are copied (shallow, so heavy values such as
+    image data stay shared); point-less elements are passed through as-is.
+    """
+    out = [dict(el) if any(key in el for key in _POINT_KEYS) else el for el in elements]
+    for el in out:
+        for key in _POINT_KEYS:
+            if key in el:
+                x, y = el[key]
+                el[key] = [x + dx, y + dy]
+    return out
+
 def convert_absolute_to_relative(layout_data: Dict[str, Any]) -> Dict[str, Any]:
     """Convert absolute positions to design-center-relative coordinates."""
     center_lines = layout_data.get('center_lines', {})
@@ -972,30 +1534,15 @@ def convert_absolute_to_relative(layout_data: Dict[str, Any]) -> Dict[str, Any]:
         return layout_data
     
     # Create new layout with relative coordinates
-    relative_layout = {
+    return {
         'object_orientation': layout_data.get('object_orientation', 0.0),
         'center_lines': {
             'horizontal': center_y,  # Store absolute position
             'vertical': center_x     # Store absolute position
         },
-        'elements': []
+        # Convert element positions to relative to center lines
+        'elements': _offset_element_points(layout_data.get('elements', []), -center_x, -center_y)
     }
-    
-    # Convert element positions to relative to center lines
-    for el in layout_data.get('elements', []):
-        rel_el = dict(el)
-        if 'position' in rel_el:
-            x_abs, y_abs = rel_el['position']
-            rel_el['position'] = [x_abs - center_x, y_abs - center_y]
-        if 'start' in rel_el:
-            x1_abs, y1_abs = rel_el['start']
-            rel_el['start'] = [x1_abs - center_x, y1_abs - center_y]
-        if 'end' in rel_el:
-            x2_abs, y2_abs = rel_el['end']
-            rel_el['end'] = [x2_abs - center_x, y2_abs - center_y]
-        relative_layout['elements'].append(rel_el)
-    
-    return relative_layout
 
 
 def convert_relative_to_absolute(scene_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -1009,30 +1556,15 @@ def convert_relative_to_absolute(scene_data: Dict[str, Any]) -> Dict[str, Any]:
         return scene_data
     
     # Create absolute layout
-    absolute_layout = {
+    return {
         'object_orientation': scene_data.get('object_orientation', 0.0),
         'center_lines': {
             'horizontal': center_y,
             'vertical': center_x
         },
-        'elements': []
+        # Convert element positions from relative to absolute
+        'elements': _offset_element_points(scene_data.get('elements', []), center_x, center_y)
     }
-    
-    # Convert element positions from relative to absolute
-    for el in scene_data.get('elements', []):
-        abs_el = dict(el)
-        if 'position' in abs_el:
-            x_rel, y_rel = abs_el['position']
-            abs_el['position'] = [x_rel + center_x, y_rel + center_y]
-        if 'start' in abs_el:
-            x1_rel, y1_rel = abs_el['start']
-            abs_el['start'] = [x1_rel + center_x, y1_rel + center_y]
-        if 'end' in abs_el:
-            x2_rel, y2_rel = abs_el['end']
-            abs_el['end'] = [x2_rel + center_x, y2_rel + center_y]
-        absolute_layout['elements'].append(abs_el)
-    
-    return absolute_layout
 
 
 @app.route('/api/configurations', methods=['POST'])
@@ -1059,6 +1591,7 @@ def save_configuration():
         }
         
         success = db.save_configuration(config_name, scene_data)
+        _invalidate_configs_json()
         if success:
             return jsonify({'success': True})
         else:
@@ -1068,12 +1601,33 @@ def save_configuration():
         return jsonify({'error': str(e)}), 500
 
 
+# Serialized /api/configurations response; dropped on save/delete
+_configs_json_cache: Optional[bytes] = None
+_configs_json_lock = Lock()
+
+
+def _invalidate_configs_json() -> None:
+    global _configs_json_cache
+    with _configs_json_lock:
+        _configs_json_cache = None
+
+
 @app.route('/api/configurations', methods=['GET'])
 def list_configurations():
     """List saved configurations."""
+    global _configs_json_cache
     try:
-        configurations = db.list_configurations()
-        return jsonify({'configurations': configurations})
+        body = _configs_json_cache
+        if body is None:
+            # Rebuild under the lock so a concurrent save/delete cannot be overwritten by a stale list
+            with _configs_json_lock:
+                body = _configs_json_cache
+                if body is None:
+                    body = app.json.dumps({'configurations': db.list_configurations()})
+                    if isinstance(body, str):
+                        body = body.encode('utf-8')
+                    _configs_json_cache = body
+        return app.response_class(body, mimetype='application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1128,6 +1682,7 @@ def delete_configuration(config_name):
     """Delete a saved configuration."""
     try:
         deleted = db.delete_configuration(config_name)
+        _invalidate_configs_json()
         if deleted:
             try:
                 last_scene = db.get_last_scene()
@@ -1163,6 +1718,11 @@ def last_scene():
         return jsonify({'error': str(e)}), 500
 
 
+def _emit_operation_state() -> None:
+    """Broadcast _operation_state to projector and control as a single packet (serialized once)."""
+    socketio.emit('operation_state_updated', _operation_state, to=['projector', 'control'])
+
+
 @app.route('/api/operation/load-scene', methods=['POST'])
 def operation_load_scene():
     """Load a scene for a specific press in operation mode."""
@@ -1197,19 +1757,20 @@ def operation_load_scene():
             'scene_name': scene_name,
             'layout_data': absolute_layout
         }
+        _bump_state_generation()
         
         # Broadcast operation state update
-        socketio.emit('operation_state_updated', _operation_state, room='projector')
-        socketio.emit('operation_state_updated', _operation_state, room='control')
+        _emit_operation_state()
         
-        # Trigger render for operation mode
+        # Trigger render for operation mode (control preview only; skip when nobody is watching)
         try:
-            svg_content = projector.generate_svg(operation_mode=OperationMode.PRODUCTION)
-            socketio.emit('layout_updated', {
-                'layout': None,
-                'svg': svg_content,
-                'operation_mode': OperationMode.PRODUCTION.value
-            }, room='control')
+            if _room_occupied('control'):
+                svg_content = projector.generate_svg(operation_mode=OperationMode.PRODUCTION)
+                socketio.emit('layout_updated', {
+                    'layout': None,
+                    'svg': svg_content,
+                    'operation_mode': OperationMode.PRODUCTION.value
+                }, room='control')
         except Exception:
             pass
         
@@ -1236,15 +1797,15 @@ def operation_clear_scene():
             'scene_name': None,
             'layout_data': None
         }
+        _bump_state_generation()
         
         # Broadcast operation state update
-        socketio.emit('operation_state_updated', _operation_state, room='projector')
-        socketio.emit('operation_state_updated', _operation_state, room='control')
+        _emit_operation_state()
         
         # Trigger render for operation mode (if any scenes still loaded)
         try:
             mode = _determine_operation_mode_from_state()
-            if mode is OperationMode.PRODUCTION:
+            if mode is OperationMode.PRODUCTION and _room_occupied('control'):
                 svg_content = projector.generate_svg(operation_mode=mode)
                 socketio.emit('layout_updated', {
                     'layout': None,
@@ -1279,33 +1840,33 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
-    pass
-    
-    # Remove from connected clients
-    for client_type, client_id in connected_clients.items():
-        if client_id == request.sid:
-            connected_clients[client_type] = None
-            break
+    # Remove from connected clients (unless a newer client already took the slot)
+    for room in _sid_rooms.pop(request.sid, ()):
+        if connected_clients[room] == request.sid:
+            connected_clients[room] = None
 
 
 @socketio.on('join_room')
 def handle_join_room(data):
     """Handle client joining a room (control or projector)."""
+    global _last_sent_layout_version, _last_sent_layout_fingerprint, _last_broadcast_key
     room = data.get('room')
     if room in ['control', 'projector']:
         join_room(room)
+        previous_sid = connected_clients[room]
+        if previous_sid is not None and previous_sid != request.sid:
+            _sid_rooms.get(previous_sid, set()).discard(room)
         connected_clients[room] = request.sid
-        pass
+        _sid_rooms.setdefault(request.sid, set()).add(room)
         
         # Send current state to new client
         if room == 'projector':
             # Inform control about current projector resolution
             emit('projector_resolution', projector_resolution, room='control')
             # Send calibrations for all presses
-            for press_id in ['press1', 'press2']:
-                calibration_data = db.load_press_calibration(press_id)
+            for press_id, calibration_data in _load_all_press_calibrations().items():
                 if calibration_data:
-                    load_press_calibration(press_id)
+                    load_press_calibration(press_id, calibration_data)
                     emit('press_calibration_updated', {
                         'press_id': press_id,
                         'calibration_data': calibration_data
@@ -1313,12 +1874,15 @@ def handle_join_room(data):
             
             # Do not send raw SVG to projector on join; wait for rasterized frames
         elif room == 'control':
+            # Make the next layout broadcast carry the full layout for the new client
+            _last_sent_layout_version = -1
+            _last_sent_layout_fingerprint = None
+            _last_broadcast_key = None
             # Send calibrations for all presses to populate control inputs on load
-            for press_id in ['press1', 'press2']:
-                calibration_data = db.load_press_calibration(press_id)
+            for press_id, calibration_data in _load_all_press_calibrations().items():
                 if calibration_data:
                     try:
-                        load_press_calibration(press_id)
+                        load_press_calibration(press_id, calibration_data)
                         emit('press_calibration_updated', {
                             'press_id': press_id,
                             'calibration_data': calibration_data
@@ -1329,25 +1893,33 @@ def handle_join_room(data):
             emit('active_press_changed', {'press_id': _active_press})
 
 
+@socketio.on('bootstrap')
+def handle_bootstrap(data):
+    """Join the given rooms and optionally send the current state, in one round trip."""
+    for room in data.get('rooms', ()):
+        handle_join_room({'room': room})
+    if data.get('want_update'):
+        handle_request_update()
+
+
 @socketio.on('leave_room')
 def handle_leave_room(data):
     """Handle client leaving a room."""
     room = data.get('room')
     if room in ['control', 'projector']:
         leave_room(room)
+        _sid_rooms.get(request.sid, set()).discard(room)
         if connected_clients[room] == request.sid:
             connected_clients[room] = None
-        pass
 
 
 @socketio.on('request_update')
 def handle_request_update():
     """Handle request for current state update."""
     # Send calibrations for all presses
-    for press_id in ['press1', 'press2']:
-        calibration_data = db.load_press_calibration(press_id)
+    for press_id, calibration_data in _load_all_press_calibrations().items():
         if calibration_data:
-            load_press_calibration(press_id)
+            load_press_calibration(press_id, calibration_data)
             emit('press_calibration_updated', {
                 'press_id': press_id,
                 'calibration_data': calibration_data
@@ -1375,13 +1947,13 @@ def handle_request_update():
                 'operation_mode': mode.value
             })
         else:
-            layout_data = projector.get_layout_data()
             svg_content = projector.generate_svg(operation_mode=mode)
             try:
                 save_debug_svg(svg_content, 'request_update_latest.svg')
             except Exception:
                 pass
-            send_layout_update_to_control(layout_data, svg_content, mode)
+            # Requesting client may not have any layout yet: always include it
+            emit('layout_updated', layout_update_payload(svg_content, mode, force_layout=True))
     except Exception as e:
         logger.exception("Error handling request_update")
 
@@ -1402,22 +1974,11 @@ def handle_layout_update(data):
             )
         
         if 'elements' in data:
-            # Clear existing elements and add new ones
-            projector.clear_layout()
-            for element in data['elements']:
-                projector.add_element(element['type'], element)
+            # Replace elements; an unchanged list leaves the layout version (and caches) intact
+            projector.set_elements(data['elements'])
         
-        # Generate and send updated SVG
-        svg_content = projector.generate_svg()
-        try:
-            save_debug_svg(svg_content, 'layout_update_latest.svg')
-        except Exception:
-            pass
-        # Notify control UI only
-        try:
-            send_layout_update_to_control(projector.get_layout_data(), svg_content, OperationMode.SCENE_SETUP)
-        except Exception:
-            pass
+        # Generate and send updated SVG (coalesced with other updates in this burst)
+        schedule_layout_broadcast()
         # Ensure calibration overlay is not shown during normal edits
         try:
             emit('stop_calibration', room='projector')
@@ -1431,6 +1992,38 @@ def handle_layout_update(data):
  
 
 
+def _boundary_pattern_png_b64(press_id: str, output_width: int, output_height: int) -> Optional[str]:
+    """Return the warped boundary pattern for a press as base64 PNG (cached per calibration/resolution)."""
+    calibrator = get_calibrator(press_id)
+    if not calibrator.is_calibrated():
+        return None
+    w_mm, h_mm = calibrator.press_width_mm, calibrator.press_height_mm
+    key = (press_id, output_width, output_height, w_mm, h_mm, calibrator.source_points.tobytes())
+    with _pattern_png_lock:
+        cached = _pattern_png_cache.get(key)
+        if cached is not None:
+            _pattern_png_cache.move_to_end(key)
+    if cached is None:
+        svg = (f'<svg width="{w_mm}mm" height="{h_mm}mm" viewBox="0 0 {w_mm} {h_mm}" xmlns="http://www.w3.org/2000/svg">'
+               f'<rect x="0" y="0" width="{w_mm}" height="{h_mm}" stroke="#ff0" stroke-width="4" fill="rgba(255,255,0,0.2)"/></svg>')
+        warped = _render_press_scene(press_id, svg, output_width, output_height)
+        if warped is None:
+            return None
+        ok, enc = cv2.imencode('.png', warped, _PNG_ENCODE_PARAMS)
+        if not ok:
+            return None
+        cached = b64encode_str(enc)
+        with _pattern_png_lock:
+            _pattern_png_cache[key] = cached
+            while len(_pattern_png_cache) > PATTERN_PNG_CACHE_SIZE:
+                _pattern_png_cache.popitem(last=False)
+    return cached
+
+
+# Calibration corner (id, label) in source_points order
+_CORNER_META = (('tl', 'Top Left'), ('tr', 'Top Right'), ('br', 'Bottom Right'), ('bl', 'Bottom Left'))
+
+
 @socketio.on('show_validation_pattern')
 def handle_show_validation_pattern():
     """Show validation pattern on projector."""
@@ -1438,18 +2031,6 @@ def handle_show_validation_pattern():
         # Enable boundary pattern to show warped rectangle (kept for context)
         projector.set_boundary_pattern_visibility(True)
 
-        # Generate and send updated SVG for boundary pattern
-        svg_content = projector.generate_svg()
-        emit('boundary_pattern_toggled', {
-            'visible': True,
-            'svg': svg_content
-        }, room='projector')
-        try:
-            emit('set_projection_mode', { 'mode': 'svg' }, room='projector')
-        except Exception:
-            pass
-
-        # Additionally, display the saved calibration corner points on the projector
         # Reload calibration to avoid stale in-memory state
         try:
             saved = db.load_press_calibration(_active_press)
@@ -1459,17 +2040,30 @@ def handle_show_validation_pattern():
         except Exception as e:
             logger.exception("Failed to reload calibration before showing points")
 
+        # Send the pre-rasterized boundary pattern instead of a full layout SVG
+        try:
+            png_b64 = _boundary_pattern_png_b64(_active_press,
+                                                projector_resolution['width'],
+                                                projector_resolution['height'])
+        except Exception:
+            logger.exception("Failed to rasterize boundary pattern")
+            png_b64 = None
+        emit('boundary_pattern_toggled', {
+            'visible': True,
+            'png_b64': png_b64
+        }, room='projector')
+
+        # Additionally, display the saved calibration corner points on the projector
         try:
             calibrator = get_calibrator(_active_press)
             src = getattr(calibrator, 'source_points', None)
             if src is not None:
-                pts = src.tolist()
-                if isinstance(pts, list) and len(pts) == 4:
+                # One C-level conversion to Python floats instead of per-coordinate float()
+                pts = np.asarray(src, dtype=np.float64).tolist()
+                if len(pts) == len(_CORNER_META):
                     points_payload = [
-                        { 'id': 'tl', 'x': float(pts[0][0]), 'y': float(pts[0][1]), 'label': 'Top Left' },
-                        { 'id': 'tr', 'x': float(pts[1][0]), 'y': float(pts[1][1]), 'label': 'Top Right' },
-                        { 'id': 'br', 'x': float(pts[2][0]), 'y': float(pts[2][1]), 'label': 'Bottom Right' },
-                        { 'id': 'bl', 'x': float(pts[3][0]), 'y': float(pts[3][1]), 'label': 'Bottom Left' },
+                        {'id': point_id, 'x': x, 'y': y, 'label': label}
+                        for (point_id, label), (x, y) in zip(_CORNER_META, pts)
                     ]
                     emit('start_calibration', {
                         'points': points_payload,
@@ -1490,12 +2084,7 @@ def handle_hide_validation_pattern():
         # Disable boundary pattern
         projector.set_boundary_pattern_visibility(False)
         
-        # Generate and send updated SVG
-        svg_content = projector.generate_svg()
-        emit('boundary_pattern_toggled', {
-            'visible': False,
-            'svg': svg_content
-        }, room='projector')
+        emit('boundary_pattern_toggled', {'visible': False}, room='projector')
         try:
             emit('set_projection_mode', { 'mode': 'frames' }, room='projector')
         except Exception:
@@ -1516,30 +2105,67 @@ def handle_start_calibration(data):
     """Handle start of interactive calibration."""
     try:
         press_id = data.get('press_id', 'unknown')
-        logger.info(f"Starting calibration for press: {press_id}")
-        emit('start_calibration', data, room='projector')
+        logger.info("Starting calibration for press: %s", press_id)
+        _emit_calibration_in_order('start_calibration', data, room='projector')
     except Exception as e:
         logger.exception("Error starting calibration")
 
 
+# Drag-rate calibration events are forwarded at most once per interval, latest payload wins
+CALIBRATION_EMIT_INTERVAL = 0.016  # seconds (~60 Hz)
+_calibration_emit_lock = Lock()
+_pending_calibration_emits = {}  # (event, room) -> latest payload
+# Held while sending, so queued and immediate calibration events go out in the order they arrived
+_calibration_send_lock = Lock()
+
+
+def _queue_calibration_emit(event: str, data, room: str) -> None:
+    """Queue a calibration event for the next flush; replaces any payload not yet sent."""
+    with _calibration_emit_lock:
+        flush_scheduled = bool(_pending_calibration_emits)
+        _pending_calibration_emits[(event, room)] = data
+    if not flush_scheduled:
+        socketio.start_background_task(_flush_calibration_emits)
+
+
+def _flush_calibration_emits() -> None:
+    socketio.sleep(CALIBRATION_EMIT_INTERVAL)
+    with _calibration_send_lock:
+        _send_pending_calibration_emits()
+
+
+def _emit_calibration_in_order(event: str, *args, room: str) -> None:
+    """Emit a calibration event immediately, after any queued drag updates it must follow."""
+    with _calibration_send_lock:
+        _send_pending_calibration_emits()
+        socketio.emit(event, *args, room=room)
+
+
+def _send_pending_calibration_emits() -> None:
+    global _pending_calibration_emits
+    with _calibration_emit_lock:
+        pending, _pending_calibration_emits = _pending_calibration_emits, {}
+    for (event, room), data in pending.items():
+        try:
+            socketio.emit(event, data, room=room)
+        except Exception:
+            # Runs at drag rate: a traceback per failed frame would flood the log
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Error forwarding %s", event, exc_info=True)
+
+
 @socketio.on('update_calibration_points')
 def handle_update_calibration_points(data):
     """Handle calibration point updates."""
-    try:
-        emit('update_calibration_points', data, room='projector')
-        emit('update_calibration_points', data, room='control')
-    except Exception as e:
-        logger.exception("Error updating calibration points")
+    _queue_calibration_emit('update_calibration_points', data, 'projector')
+    _queue_calibration_emit('update_calibration_points', data, 'control')
 
 
 @socketio.on('calibration_point_dragged')
 def handle_calibration_point_dragged(data):
     """Handle calibration point drag events."""
-    try:
-        # Forward to control interface
-        emit('calibration_point_dragged', data, room='control')
-    except Exception as e:
-        logger.exception("Error handling calibration point drag")
+    # Forward to control interface
+    _queue_calibration_emit('calibration_point_dragged', data, 'control')
 
 
 @socketio.on('calibration_point_selected')
@@ -1547,18 +2173,37 @@ def handle_calibration_point_selected(data):
     """Handle calibration point selection events."""
     try:
         # Forward to control interface
-        emit('calibration_point_selected', data, room='control')
-    except Exception as e:
-        logger.exception("Error handling calibration point selection")
+        _emit_calibration_in_order('calibration_point_selected', data, room='control')
+    except Exception:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Error handling calibration point selection", exc_info=True)
 
 
 @socketio.on('stop_calibration')
 def handle_stop_calibration():
     """Handle stop of interactive calibration."""
     try:
-        emit('stop_calibration', room='projector')
+        _emit_calibration_in_order('stop_calibration', room='projector')
     except Exception as e:
         logger.exception("Error stopping calibration")
+def _persist_resolution(resolution: dict) -> None:
+    """Atomically write the projector resolution to config/projector_resolution.json."""
+    try:
+        debug_dir = os.path.join('config')
+        os.makedirs(debug_dir, exist_ok=True)
+        path = os.path.join(debug_dir, 'projector_resolution.json')
+        if orjson is not None:
+            payload = orjson.dumps(resolution, option=orjson.OPT_INDENT_2)
+        else:
+            payload = json.dumps(resolution, indent=2).encode('utf-8')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fp:
+            fp.write(payload)
+        os.replace(tmp_path, path)
+    except Exception:
+        logger.exception("Failed to save projector resolution")
+
+
 @socketio.on('projector_resolution')
 def handle_projector_resolution(data):
     """Receive projector reported resolution and broadcast to control."""
@@ -1567,14 +2212,8 @@ def handle_projector_resolution(data):
         h = int(data.get('height', projector_resolution['height']))
         projector_resolution['width'] = max(1, w)
         projector_resolution['height'] = max(1, h)
-        # Persist to file for debugging/inspection
-        try:
-            debug_dir = os.path.join('config')
-            os.makedirs(debug_dir, exist_ok=True)
-            with open(os.path.join(debug_dir, 'projector_resolution.json'), 'w') as fp:
-                json.dump(projector_resolution, fp, indent=2)
-        except Exception as e:
-            logger.exception("Failed to save projector resolution")
+        # Persist to file for debugging/inspection (off the handler thread, in order)
+        _debug_io_pool.submit(_persist_resolution, dict(projector_resolution))
         emit('projector_resolution', projector_resolution, room='control')
     except Exception as e:
         logger.exception("Error handling projector resolution")
@@ -1590,81 +2229,172 @@ def handle_set_debug_mode(data):
         logger.exception("Error setting debug mode")
 
 
-def _render_press_scene(press_id: str, svg_str: str, output_width: int, output_height: int) -> np.ndarray:
-    """
-    Render a scene for a specific press and apply perspective transformation.
-    
-    Args:
-        press_id: ID of the press to render
-        svg_str: SVG string to render (in press space, mm coordinates)
-        output_width: Output width in projector pixels
-        output_height: Output height in projector pixels
-    
-    Returns:
-        Warped image as numpy array (BGRA), or None if rendering failed
-    """
+# Projector warp interpolation; HIGH_QUALITY_WARP switches to bicubic for debugging
+WARP_INTERP = cv2.INTER_LINEAR
+
+def _warp_interpolation() -> int:
+    return cv2.INTER_CUBIC if app.config.get('HIGH_QUALITY_WARP') else WARP_INTERP
 
+def _detect_cuda() -> bool:
+    """Return True if OpenCV was built with CUDA and a device is present."""
+    try:
+        return hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except cv2.error:
+        return False
+
+_cuda_enabled = _detect_cuda()
+# Persistent GPU buffers for the projector warp (reallocated only when sizes change)
+_gpu_lock = Lock()
+_gpu_src = None
+_gpu_dst = None
+
+def _warp_on_gpu(img: np.ndarray, H_inv: np.ndarray, size, interpolation: int,
+                 dst: Optional[np.ndarray] = None) -> np.ndarray:
+    """Warp img into projector space with cv2.cuda.warpPerspective."""
+    global _gpu_src, _gpu_dst
+    with _gpu_lock:
+        if _gpu_src is None:
+            _gpu_src = cv2.cuda_GpuMat()
+            _gpu_dst = cv2.cuda_GpuMat()
+        _gpu_src.upload(img)
+        cv2.cuda.warpPerspective(_gpu_src, H_inv, size, dst=_gpu_dst, flags=interpolation,
+                                 borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+        return _gpu_dst.download(dst) if dst is not None else _gpu_dst.download()
+
+_gpu_acc = None
+
+def _composite_on_gpu(rasters, size, interpolation: int, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    """Warp each (image, H_inv) on the GPU and max-blend them there; only the composite is downloaded."""
+    global _gpu_src, _gpu_dst, _gpu_acc
+    with _gpu_lock:
+        if _gpu_src is None:
+            _gpu_src = cv2.cuda_GpuMat()
+            _gpu_dst = cv2.cuda_GpuMat()
+        if _gpu_acc is None:
+            _gpu_acc = cv2.cuda_GpuMat()
+        for i, (img, H_inv) in enumerate(rasters):
+            _gpu_src.upload(img)
+            cv2.cuda.warpPerspective(_gpu_src, H_inv, size, dst=_gpu_acc if i == 0 else _gpu_dst,
+                                     flags=interpolation, borderMode=cv2.BORDER_CONSTANT,
+                                     borderValue=(0, 0, 0))
+            if i:
+                cv2.cuda.max(_gpu_acc, _gpu_dst, dst=_gpu_acc)
+        return _gpu_acc.download(dst) if dst is not None else _gpu_acc.download()
+
+# Renders the presses of an operation-mode frame concurrently (one worker per press)
+_press_render_pool = ThreadPoolExecutor(max_workers=len(_PRESS_IDS))
+
+# Render-worker-owned warp outputs per press (plus the GPU composite), reused across frames
+_warp_buffers = {}
+_COMPOSITE_BUFFER = '_composite'
+
+def _warp_buffer(press_id: str, output_width: int, output_height: int) -> np.ndarray:
+    """Get the reusable BGR warp destination for a press, reallocating only on resize."""
+    buf = _warp_buffers.get(press_id)
+    if buf is None or buf.shape[:2] != (output_height, output_width):
+        buf = np.empty((output_height, output_width, 3), dtype=np.uint8)
+        _warp_buffers[press_id] = buf
+    return buf
+
+
+def _press_raster_size(calibrator) -> tuple:
+    """(width, height) a press is rasterized at: its raw size scaled by RASTER_SCALE."""
+    raw_width_px, raw_height_px = calibrator.get_raw_size_px()
+    raster_scale = app.config.get('RASTER_SCALE', 1.0)
+    return (max(1, int(round(raw_width_px * raster_scale))),
+            max(1, int(round(raw_height_px * raster_scale))))
+
+
+def _rasterize_press_scene(press_id: str, svg_str: str):
+    """Rasterize a press scene in press space.
+
+    Returns (calibrator, BGR raster, raster_size), or None if the press is not calibrated.
+    """
     # Ensure calibration is loaded
     calibrator = get_calibrator(press_id)
     if not calibrator.is_calibrated():
         load_press_calibration(press_id)
         if not calibrator.is_calibrated():
-            logger.warning(f"Calibration not available for {press_id}, cannot render")
+            logger.warning("Calibration not available for %s, cannot render", press_id)
             return None
     
-    # Process SVG (inline images, etc.)
-    svg_processed = adjust_upload_image_heights(svg_str)
-    svg_processed = inline_upload_image_links(svg_processed)
+    # Process SVG (inline images, etc.) into the UTF-8 bytes shared by rasterizer and debug writer
+    svg_bytes = process_upload_images(svg_str)
     
+    raster_size = _press_raster_size(calibrator)
 
-    raw_width_px, raw_height_px = calibrator.get_raw_size_px()
+    # Rasterize SVG at (scaled) press-space resolution, already composited onto black (BGR)
+    img_composited = rasterize_svg(svg_bytes, *raster_size)
 
+    save_debug_png(img_composited, '_render_press_scene.png')
+    save_debug_svg(svg_bytes, '_render_press_scene.svg')
+    return calibrator, img_composited, raster_size
 
-    # Rasterize SVG at press-space resolution
-    png_bytes = cairosvg.svg2png(bytestring=svg_processed.encode('utf-8'), 
-                                  output_width=raw_width_px, 
-                                  output_height=raw_height_px)
-    
-    # Decode PNG to image (BGRA)
-    buf = np.frombuffer(png_bytes, dtype=np.uint8)
-    img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
-    if img is None:
-        logger.warning(f"Failed to decode PNG for {press_id}")
-        return None
 
-    save_debug_png(img, '_render_press_scene.png')
-    save_debug_svg(svg_processed, '_render_press_scene.svg')
-    
-    
-    # # Ensure image has alpha channel (BGRA)
-    if img.shape[2] == 3:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
-    
-    # Composite image onto black background (handle transparent pixels)
-    # Create black background
-    black_bg = np.zeros((img.shape[0], img.shape[1], 4), dtype=np.uint8)
-    black_bg[:, :, 3] = 255  # Opaque black
+def _render_press_scene(press_id: str, svg_str: str, output_width: int, output_height: int,
+                        dst: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Render a scene for a specific press and apply perspective transformation.
     
-    # Composite: blend image onto black background
-    if img.shape[2] == 4:
-        alpha = img[:, :, 3:4] / 255.0
-        img_composited = (img[:, :, :4] * alpha + black_bg * (1 - alpha)).astype(np.uint8)
-    else:
-        img_composited = img
+    Args:
+        press_id: ID of the press to render
+        svg_str: SVG string to render (in press space, mm coordinates)
+        output_width: Output width in projector pixels
+        output_height: Output height in projector pixels
+        dst: Optional preallocated (output_height, output_width, 3) uint8 output buffer
     
+    Returns:
+        Warped image as numpy array (BGR), or None if rendering failed
+    """
+    rasterized = _rasterize_press_scene(press_id, svg_str)
+    if rasterized is None:
+        return None
+    calibrator, img_composited, raster_size = rasterized
+
     # Apply perspective transformation to map from press space to projector space
     if not debug_bypass_warp and calibrator.is_calibrated():
-        # Get transformation matrix (maps from projector pixels to press space)
-        H = calibrator.transformation_matrix
-        # We need inverse: map from press space to projector pixels
-        H_inv = np.linalg.inv(H)
-        # Apply perspective transformation
-        # Use BORDER_CONSTANT with black to fill areas outside warped region
-        warped = cv2.warpPerspective(img_composited, H_inv, (output_width, output_height), 
-                                      flags=cv2.INTER_CUBIC, 
-                                      borderMode=cv2.BORDER_CONSTANT,
-                                      borderValue=(0, 0, 0, 255))
-        logger.debug(f"Applied perspective transformation for {press_id}")
+        interpolation = _warp_interpolation()
+        warped = None
+        if _cuda_enabled:
+            try:
+                warped = _warp_on_gpu(img_composited, calibrator.get_raster_warp_matrix(*raster_size),
+                                      (output_width, output_height), interpolation, dst)
+            except cv2.error:
+                logger.exception("CUDA warp failed for %s; falling back to CPU", press_id)
+        placement = None
+        if warped is None:
+            placement = calibrator.get_axis_aligned_placement(output_width, output_height, raster_size)
+        if placement is not None:
+            # Pure scale + integer shift (e.g. press and projector aligned 1:1): copy or resize
+            # the raster into place instead of running the per-pixel perspective sampler
+            x, y, place_w, place_h = placement
+            if dst is None:
+                dst = np.empty((output_height, output_width, 3), dtype=np.uint8)
+            if (place_w, place_h) != (output_width, output_height):
+                dst.fill(0)
+            view = dst[y:y + place_h, x:x + place_w]
+            if (place_w, place_h) == raster_size:
+                np.copyto(view, img_composited)
+            else:
+                cv2.resize(img_composited, (place_w, place_h), dst=view, interpolation=interpolation)
+            warped = dst
+        if warped is None:
+            # Remap maps sample press space for every projector pixel of the ROI the press lands in
+            # (cached per calibration); the rest of the frame is just black
+            (x, y, roi_w, roi_h), map1, map2 = calibrator.get_projector_remap(output_width, output_height,
+                                                                             raster_size)
+            if dst is None:
+                dst = np.empty((output_height, output_width, 3), dtype=np.uint8)
+            if (roi_w, roi_h) != (output_width, output_height):
+                dst.fill(0)
+            if map1 is not None:
+                # Apply perspective transformation into the ROI view (written in place)
+                # Use BORDER_CONSTANT with black to fill areas outside warped region
+                cv2.remap(img_composited, map1, map2, interpolation, dst=dst[y:y + roi_h, x:x + roi_w],
+                          borderMode=cv2.BORDER_CONSTANT,
+                          borderValue=(0, 0, 0))
+            warped = dst
+        logger.debug("Applied perspective transformation for %s", press_id)
     else:
         raise NotImplementedError("Debug bypass warp is not implemented")
     # else:
@@ -1674,108 +2404,223 @@ def _render_press_scene(press_id: str, svg_str: str, output_width: int, output_h
     #     else:
     #         warped = img_composited
     #     if not calibrator.is_calibrated():
-    #         logger.warning(f"Calibration not available for {press_id}, rendering without perspective transformation")
+    #         logger.warning("Calibration not available for %s, rendering without perspective transformation", press_id)
     
     return warped
 
 
+# (frame key, encoded JPEG) of the most recently rendered projector frame
+_last_frame = (None, None)
+# Bumped on every upload: scenes refer to images by filename, so the SVG text alone
+# does not change when a file is replaced
+_upload_generation = 0
+
+def _frame_key(operation_mode: OperationMode, output_width: int, output_height: int, scenes) -> bytes:
+    """Digest of everything a projector frame depends on: scenes, uploads, calibrations, output size, warp settings."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(struct.pack('<?IIdiQ', debug_bypass_warp, output_width, output_height,
+                         app.config.get('RASTER_SCALE', 1.0), _warp_interpolation(), _upload_generation))
+    h.update(operation_mode.value.encode('utf-8'))
+    for press_id, svg in scenes:
+        h.update(press_id.encode('utf-8'))
+        h.update(svg.encode('utf-8'))
+        # Uploads replaced on disk leave the SVG text unchanged
+        h.update(repr(_svg_upload_stamps(svg)).encode('utf-8'))
+        calibrator = get_calibrator(press_id)
+        if calibrator.transformation_matrix_inv is not None:
+            h.update(struct.pack('<II', *calibrator.get_raw_size_px()))
+            h.update(calibrator.transformation_matrix_inv.tobytes())
+    return h.digest()
+
+
+def _emit_projector_frame(frame: bytes, operation_mode: OperationMode):
+    """Send an encoded frame to the projector and switch it to frame display."""
+    # Send raw bytes: Socket.IO ships them as a binary attachment (no base64 inflation)
+    socketio.emit('projector_frame', {'image': frame, 'format': PROJECTOR_FRAME_FORMAT, 'operation_mode': operation_mode.value}, room='projector')
+    socketio.emit('set_projection_mode', { 'mode': 'frames' }, room='projector')
+    logger.warning("[_perform_render_svg] Emitted projector_frame with operation_mode: %s", operation_mode.value)
+
+
+def _composite_scenes_on_gpu(scenes, output_width: int, output_height: int) -> Optional[np.ndarray]:
+    """Rasterize every press scene, then warp and blend them in one GPU pass (None on failure)."""
+    interpolation = _warp_interpolation()
+    rasters = []
+    for press_id, press_svg in scenes:
+        rasterized = _rasterize_press_scene(press_id, press_svg)
+        if rasterized is None:
+            return None
+        calibrator, img, raster_size = rasterized
+        rasters.append((img, calibrator.get_raster_warp_matrix(*raster_size)))
+    try:
+        return _composite_on_gpu(rasters, (output_width, output_height), interpolation,
+                                 dst=_warp_buffer(_COMPOSITE_BUFFER, output_width, output_height))
+    except cv2.error:
+        logger.exception("CUDA composite failed; falling back to per-press warps")
+        return None
+
+
 def _perform_render_svg(data):
-    """Perform the actual rasterization and emission of one SVG payload."""
+    """Rasterize and warp one SVG payload and hand the frame to the encoder."""
     svg_str = data.get('svg', '')
     if not svg_str:
         return
+    # Frames are only consumed by the projector; nobody to send to means nothing to render
+    if not _room_occupied('projector'):
+        return
         
     # Determine operation mode from payload or current state
     operation_mode = None
     if 'operation_mode' in data:
         operation_mode = _parse_operation_mode(data['operation_mode'])
         if operation_mode is None:
-            logger.warning(f"[_perform_render_svg] Unable to parse operation_mode: {data['operation_mode']!r}")
+            logger.warning("[_perform_render_svg] Unable to parse operation_mode: %r", data['operation_mode'])
     if operation_mode is None:
         operation_mode = _determine_operation_mode_from_state()
-        # logger.info(f"[_perform_render_svg] operation_mode not in data, derived from state: {operation_mode.value}")
+        # logger.info("[_perform_render_svg] operation_mode not in data, derived from state: %s", operation_mode.value)
     else:
         pass
-        # logger.info(f"[_perform_render_svg] Received explicit operation_mode from data: {operation_mode.value}")
+        # logger.info("[_perform_render_svg] Received explicit operation_mode from data: %s", operation_mode.value)
     
-    # logger.info(f"[_perform_render_svg] Final operation_mode: {operation_mode.value}")
+    # logger.info("[_perform_render_svg] Final operation_mode: %s", operation_mode.value)
     
     out_w, out_h = projector_resolution['width'], projector_resolution['height']
 
-    # Render based on mode
+    # Collect the (press, svg) scenes this frame is made of
     if operation_mode is OperationMode.SCENE_SETUP:
-        # Normal mode: process SVG and render single press scene
-        svg_processed = adjust_upload_image_heights(svg_str)
-        svg_processed = inline_upload_image_links(svg_processed)
-        
-        # Save SVG to disk before rasterizing (with pretty printing)
-
-        
-        # Render single press scene
-        projector_image = _render_press_scene(_active_press, svg_processed, out_w, out_h)
-        assert projector_image is not None
+        scenes = [(_active_press, svg_str)]
     else:
-        # Operation mode: Render each press separately, apply perspective transformation, then composite
-        # Create a blank black canvas for compositing (opaque black background)
-        projector_image = None # np.zeros((out_h, out_w, 3), dtype=np.uint8)
-        
+        scenes = []
         # Process each press that has a scene loaded
-        for press_id in ['press1', 'press2']:
+        for press_id in _PRESS_IDS:
             press_state = _operation_state.get(press_id, {})
             if not press_state.get('layout_data'):
                 continue
-            
             # Generate SVG for this press only
-            press_svg = pj_generate_svg(press_id=press_id, operation_mode=operation_mode)
-            
-            # Render and warp this press's scene
-            press_warped = _render_press_scene(press_id, press_svg, out_w, out_h)
+            scenes.append((press_id, pj_generate_svg(press_id=press_id, operation_mode=operation_mode)))
+
+    # Identical scenes, calibration and output size give an identical frame: resend the last one
+    frame_key = _frame_key(operation_mode, out_w, out_h, scenes)
+    last_key, last_frame = _last_frame
+    if frame_key == last_key:
+        # Goes through the encode stage too so it cannot overtake a frame still being encoded
+        _submit_frame(frame_key, None, last_frame, operation_mode)
+        return
+
+    # Render based on mode
+    if operation_mode is OperationMode.SCENE_SETUP:
+        # Normal mode: render single press scene (upload images are processed there)
+        projector_image = _render_press_scene(_active_press, svg_str, out_w, out_h,
+                                              dst=_warp_buffer(_active_press, out_w, out_h))
+        assert projector_image is not None
+    else:
+        # Operation mode: Render each press separately, apply perspective transformation, then composite
+        # Create a blank black canvas for compositing (opaque black background)
+        projector_image = None # np.zeros((out_h, out_w, 3), dtype=np.uint8)
+        # With CUDA, warp and blend all presses on the GPU and download the composite once
+        gpu_image = None
+        if _cuda_enabled and len(scenes) > 1 and not debug_bypass_warp:
+            gpu_image = _composite_scenes_on_gpu(scenes, out_w, out_h)
+        
+        # Presses are independent and cairo/cv2 release the GIL: render and warp them concurrently
+        press_renders = []
+        if gpu_image is None:
+            press_renders = [
+                (press_id, _press_render_pool.submit(_render_press_scene, press_id, press_svg, out_w, out_h,
+                                                     dst=_warp_buffer(press_id, out_w, out_h)))
+                for press_id, press_svg in scenes
+            ]
+        for press_id, future in press_renders:
+            press_warped = future.result()
             assert press_warped is not None
             if projector_image is None:
                 projector_image = press_warped
             else:
-                projector_image = cv2.add(projector_image, press_warped)
-        logger.debug(f"Composited warped image for {press_id} in operation mode")
+                # Accumulate in place into the first press's warp buffer (no per-press frame allocation);
+                # presses sit on black, so max equals add wherever they do not overlap. Outside its
+                # ROI a press is all black, so only that rectangle needs to be merged. The ROI
+                # must be the one the warp used, which depends on the raster size
+                calibrator = get_calibrator(press_id)
+                x, y, roi_w, roi_h = calibrator.get_projector_roi(out_w, out_h, _press_raster_size(calibrator))
+                roi = (slice(y, y + roi_h), slice(x, x + roi_w))
+                cv2.max(projector_image[roi], press_warped[roi], dst=projector_image[roi])
+        if gpu_image is not None:
+            projector_image = gpu_image
+        logger.debug("Composited warped images for %d presses in operation mode", len(scenes))
     
 
-    ok, enc = cv2.imencode('.png', projector_image)
-    if not ok:
-        return
-    b64 = base64.b64encode(enc.tobytes()).decode('ascii')
-    socketio.emit('projector_frame', {'image': b64, 'operation_mode': operation_mode.value}, room='projector')
-    socketio.emit('set_projection_mode', { 'mode': 'frames' }, room='projector')
-    logger.warning(f"[_perform_render_svg] Emitted projector_frame with operation_mode: {operation_mode.value}")
+    # Hand off to the encoder so the next frame can render meanwhile; the warp buffers are
+    # rewritten by the next render, so the encoder gets its own copy
+    _submit_frame(frame_key, projector_image.copy(), None, operation_mode)
+
+
+def _encode_frame(image: np.ndarray) -> Optional[bytes]:
+    """Encode a BGR projector frame in PROJECTOR_FRAME_FORMAT (None if encoding failed)."""
+    # JPEG encodes several times faster than PNG and yields a much smaller payload;
+    # frames are opaque BGR so nothing is lost by dropping PNG's alpha support
+    if PROJECTOR_FRAME_FORMAT == 'png':
+        ok, enc = cv2.imencode('.png', image, _PNG_ENCODE_PARAMS)
+    else:
+        ok, enc = cv2.imencode('.jpg', image, _JPEG_ENCODE_PARAMS)
+    return enc.tobytes() if ok else None
+
+
+def _submit_frame(frame_key: bytes, image: Optional[np.ndarray], frame: Optional[bytes],
+                  operation_mode: OperationMode) -> None:
+    """Queue a rendered image (or an already encoded frame) for the encoder; newest wins."""
+    try:
+        _encode_queue.get_nowait()
+    except socketio.server.eio.get_queue_empty_exception():
+        pass
+    _encode_queue.put((frame_key, image, frame, operation_mode))
+
+
+def _encode_loop():
+    """Encode worker: encodes and emits frames while the render worker works on the next one."""
+    global _last_frame
+    while True:
+        frame_key, image, frame, operation_mode = _encode_queue.get()
+        try:
+            if frame is None:
+                frame = _encode_frame(image)
+                if frame is None:
+                    continue
+                _last_frame = (frame_key, frame)
+            _emit_projector_frame(frame, operation_mode)
+        except Exception:
+            logger.exception("Error encoding projector frame")
+
+
+def _render_loop():
+    """Render worker: takes queued payloads one at a time for the lifetime of the server."""
+    while True:
+        queued_at, payload = _render_queue.get()
+        try:
+            _perform_render_svg(payload)
+        except Exception:
+            logger.exception("Error rendering SVG")
+        # The queued payload is always the newest one, so it is rendered however late; report stalls instead
+        latency = time.monotonic() - queued_at
+        if latency > RENDER_STALL_WARN:
+            logger.warning("Render took %.0f ms from request to encoder hand-off", latency * 1000.0)
 
 
 @socketio.on('render_svg')
 def handle_render_svg(data):
-    """Coalesce rapid render requests: keep only the newest while rendering."""
-    global _latest_render_payload, _render_worker_running
+    """Queue the newest render request; a queued request not yet started is replaced."""
+    global _render_queue, _encode_queue
 
     with _render_lock:
-        _latest_render_payload = data
-        if _render_worker_running:
-            return
-        _render_worker_running = True
-
-    def _render_worker():
-        global _latest_render_payload, _render_worker_running
+        if _render_queue is None:
+            _encode_queue = socketio.server.eio.create_queue(maxsize=1)
+            socketio.start_background_task(_encode_loop)
+            _render_queue = socketio.server.eio.create_queue(maxsize=1)
+            socketio.start_background_task(_render_loop)
+        # Drop a stale pending payload so only the latest SVG gets rendered
         try:
-            while True:
-                with _render_lock:
-                    payload = _latest_render_payload
-                    _latest_render_payload = None
-                if payload is None:
-                    break
-                try:
-                    _perform_render_svg(payload)
-                except Exception:
-                    logger.exception("Error rendering SVG")
-        finally:
-            with _render_lock:
-                _render_worker_running = False
-
-    socketio.start_background_task(_render_worker)
+            _render_queue.get_nowait()
+        except socketio.server.eio.get_queue_empty_exception():
+            pass
+        _render_queue.put((time.monotonic(), data))
 
 
 if __name__ == '__main__':
@@ -1784,11 +2629,10 @@ if __name__ == '__main__':
     logger.info("=" * 60)
     
     # Load existing calibrations for all presses if available
-    for press_id in ['press1', 'press2']:
-        calibration_data = db.load_press_calibration(press_id)
+    for press_id, calibration_data in _load_all_press_calibrations().items():
         if calibration_data:
-            load_press_calibration(press_id)
-            logger.info(f"Loaded calibration for {press_id}")
+            load_press_calibration(press_id, calibration_data)
+            logger.info("Loaded calibration for %s", press_id)
     
     # Start periodic updates
     start_periodic_updates()
@@ -97,6 +97,38 @@ def test_calibration():
     print("Calibration test completed.\n")
 
 
+def test_projector_remap():
+    """Test that the ROI remap matches a full-frame warp for downscaled rasters."""
+    print("Testing projector remap...")
+    
+    import cv2
+    import numpy as np
+    
+    calibrator = Calibrator()
+    calibrator.set_calibration_from_target(
+        [[300, 200], [1500, 260], [1450, 950], [350, 900]],
+        120,
+        80
+    )
+    raw_width_px, raw_height_px = calibrator.get_raw_size_px()
+    
+    for raster_scale in (0.25, 0.5):
+        raster_size = (int(raw_width_px * raster_scale), int(raw_height_px * raster_scale))
+        raster = np.full((raster_size[1], raster_size[0], 3), 255, dtype=np.uint8)
+        matrix = calibrator.get_raster_warp_matrix(*raster_size)
+        (x, y, w, h), _, _ = calibrator.get_projector_remap(1920, 1080, raster_size)
+        
+        for interpolation in (cv2.INTER_LINEAR, cv2.INTER_CUBIC):
+            # Nothing the full warp draws may fall outside the ROI the remap fills
+            full = cv2.warpPerspective(raster, matrix, (1920, 1080), flags=interpolation)
+            full[y:y + h, x:x + w] = 0
+            ok = not full.any()
+            print(f"  ROI covers warp (scale {raster_scale}, interp {interpolation}): {'✓' if ok else '✗'}")
+            assert ok, f"{int(full.any(axis=-1).sum())} warped pixels outside the ROI"
+    
+    print("Projector remap test completed.\n")
+
+
 def test_projector():
     """Test projector management."""
     print("Testing projector...")
@@ -177,6 +209,7 @@ def main():
     try:
         test_database()
         test_calibration()
+        test_projector_remap()
         test_projector()
         test_file_manager()
         
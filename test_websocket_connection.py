@@ -6,12 +6,47 @@ Tests if clients can connect to the server and communicate.
 
 import sys
 import time
+import asyncio
+import importlib
+import importlib.util
+
+# Client dependencies (module -> pip requirement), checked without importing them twice
+_DEPENDENCIES = {'socketio': 'python-socketio[client]', 'requests': 'requests'}
+_missing = [req for module, req in _DEPENDENCIES.items() if importlib.util.find_spec(module) is None]
+if _missing:
+    if '--install-deps' not in sys.argv:
+        sys.exit(f"Missing {', '.join(_missing)}; pass --install-deps or run: pip install {' '.join(_missing)}")
+    import subprocess
+    subprocess.check_call([sys.executable, '-m', 'pip', 'install', *_missing])
+    importlib.invalidate_caches()
+
 import socketio
 import requests
-from threading import Thread
+from requests.adapters import HTTPAdapter
+from threading import Event, Lock, Thread, current_thread, main_thread
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from queue import SimpleQueue
 import signal
 import subprocess
 import os
+import socket
+from urllib.parse import urlsplit
+
+# Disable Nagle on the WebSocket transport so small control emits are sent immediately
+WEBSOCKET_OPTIONS = {'sockopt': ((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),)}
+
+# Bit assigned to each test in the results mask, in report order
+FLAGS = {
+    'server_startup': 1 << 0,
+    'http_accessible': 1 << 1,
+    'control_connection': 1 << 2,
+    'projector_connection': 1 << 3,
+    'room_joining': 1 << 4,
+    'message_sending': 1 << 5,
+    'message_receiving': 1 << 6,
+}
+ALL_MASK = sum(FLAGS.values())
 
 
 class WebSocketConnectionTest:
@@ -20,51 +55,93 @@ class WebSocketConnectionTest:
     def __init__(self, base_url='http://localhost:5670'):
         self.base_url = base_url
         self.server_process = None
+        # WSGI server and its thread when the app is served in-process
+        self._wsgi_server = None
         self.server_started = False
+        # One keep-alive connection shared by the startup probe and the HTTP checks
+        self.http = requests.Session()
+        self.http.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
         self.control_client = None
         self.projector_client = None
-        self.test_results = {
-            'server_startup': False,
-            'http_accessible': False,
-            'control_connection': False,
-            'projector_connection': False,
-            'room_joining': False,
-            'message_sending': False,
-            'message_receiving': False
-        }
-        self.received_messages = []
+        # Passed tests as a bitmask of FLAGS
+        self.results = 0
+        self.received_messages = deque(maxlen=64)
+        # Acknowledgements of emits awaiting confirmation, and the tests they confirm
+        self._ack_lock = Lock()
+        self._pending_acks = 0
+        self._acks_done = Event()
+        self._acks_done.set()
+        self._batch = set()
+        # Per-client outgoing queue and the single writer thread draining it
+        self._writers = {}
+    
+    def _on_sigint(self, signum, frame):
+        """Kill the server's process group right away, then unwind as a normal Ctrl-C."""
+        if self.server_process and self.server_process.poll() is None:
+            try:
+                os.killpg(self.server_process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        raise KeyboardInterrupt
     
-    def start_server(self):
-        """Start the server in a separate process."""
+    def _record(self, test_name, passed):
+        """Set or clear the result bit for a test and return the outcome."""
+        if passed:
+            self.results |= FLAGS[test_name]
+        else:
+            self.results &= ~FLAGS[test_name]
+        return passed
+    
+    def _passed(self, test_name):
+        return bool(self.results & FLAGS[test_name])
+    
+    def start_server(self, in_process=False):
+        """Start the server in a separate process, or in a thread of this one."""
         print("Starting server...")
         try:
-            self.server_process = subprocess.Popen(
+            # Run the setup step to completion; only the Flask process is kept
+            subprocess.run(
                 [sys.executable, 'start_server.py', '--setup-only'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                check=True,
+                timeout=30,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
                 cwd=os.path.dirname(os.path.abspath(__file__))
             )
             
-            # Try to start the actual server
+            if in_process:
+                return self._serve_in_process()
+            
+            # Try to start the actual server; its output is discarded since nothing reads
+            # it, and an unread pipe would block Flask once the buffer fills
             self.server_process = subprocess.Popen(
                 [sys.executable, '-m', 'flask', 'run', '--host', '0.0.0.0', '--port', '5670'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
                 env={**os.environ, 'FLASK_APP': 'backend/server.py'},
-                cwd=os.path.dirname(os.path.abspath(__file__))
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                # Own process group, so cleanup can signal any reloader child as well
+                start_new_session=True
             )
             
-            # Wait for server to start
-            max_attempts = 30
-            for i in range(max_attempts):
+            # Wait for server to start: probe with exponential backoff (25 ms up to 500 ms)
+            url = urlsplit(self.base_url)
+            address = (url.hostname or 'localhost', url.port or 80)
+            delay = 0.025
+            deadline = time.monotonic() + 15
+            while time.monotonic() < deadline:
                 try:
-                    response = requests.get(f'{self.base_url}/control', timeout=1)
+                    # A bare TCP connect is cheap; only issue the HTTP GET once the port listens
+                    socket.create_connection(address, timeout=0.1).close()
+                    response = self.http.get(f'{self.base_url}/control', timeout=0.5)
                     if response.status_code == 200:
                         self.server_started = True
                         print("✓ Server started successfully")
                         return True
-                except:
-                    time.sleep(0.5)
+                except (OSError, requests.RequestException):
+                    pass
+                time.sleep(delay)
+                delay = min(delay * 1.5, 0.5)
             
             print("✗ Server failed to start within timeout")
             return False
@@ -73,82 +150,123 @@ class WebSocketConnectionTest:
             print(f"✗ Error starting server: {e}")
             return False
     
+    def _serve_in_process(self):
+        """Serve the app from a thread, skipping the child interpreter's startup and imports."""
+        from werkzeug.serving import make_server
+        
+        repo_dir = os.path.dirname(os.path.abspath(__file__))
+        # The server resolves config/ and debug/ against the cwd and imports its siblings flat
+        os.chdir(repo_dir)
+        sys.path.insert(0, os.path.join(repo_dir, 'backend'))
+        from backend.server import app
+        
+        # The socket is bound and listening once make_server returns: no readiness polling
+        self._wsgi_server = make_server('0.0.0.0', urlsplit(self.base_url).port or 80, app, threaded=True)
+        Thread(target=self._wsgi_server.serve_forever, daemon=True).start()
+        self.server_started = True
+        print("✓ Server started in-process")
+        return True
+    
     def check_http_accessible(self):
         """Check if HTTP server is accessible."""
         print("\nTesting HTTP accessibility...")
         try:
-            response = requests.get(f'{self.base_url}/control', timeout=5)
-            self.test_results['http_accessible'] = (response.status_code == 200)
+            response = self.http.get(f'{self.base_url}/control', timeout=5)
+            accessible = self._record('http_accessible', response.status_code == 200)
             
-            if self.test_results['http_accessible']:
+            if accessible:
                 print("✓ HTTP server is accessible")
             else:
                 print(f"✗ HTTP server returned status code: {response.status_code}")
             
-            return self.test_results['http_accessible']
+            return accessible
         except Exception as e:
             print(f"✗ HTTP server not accessible: {e}")
             return False
     
-    def test_control_connection(self):
-        """Test control client connection."""
-        print("\nTesting control client connection...")
+    def _connect_client(self, which):
+        """Connect one client ('control' or 'projector'); returns (client, connected)."""
+        label = which.capitalize()
+        client = socketio.Client(websocket_extra_options=WEBSOCKET_OPTIONS)
+        ready = Event()
+        
+        @client.on('connect')
+        def on_connect():
+            ready.set()
+            print(f"  ✓ {label} client connected")
+        
+        @client.on('disconnect')
+        def on_disconnect():
+            print(f"  {label} client disconnected")
+        
         try:
-            self.control_client = socketio.Client()
-            
-            connected = False
-            
-            @self.control_client.on('connect')
-            def on_connect():
-                nonlocal connected
-                connected = True
-                print("  ✓ Control client connected")
-            
-            @self.control_client.on('disconnect')
-            def on_disconnect():
-                print("  Control client disconnected")
-            
-            self.control_client.connect(self.base_url, wait_timeout=5)
-            time.sleep(1)
-            
-            self.test_results['control_connection'] = connected and self.control_client.connected
-            return self.test_results['control_connection']
-            
+            client.connect(self.base_url, wait_timeout=5)
+            return client, ready.wait(timeout=5) and client.connected
         except Exception as e:
-            print(f"✗ Control client connection failed: {e}")
-            return False
+            print(f"✗ {label} client connection failed: {e}")
+            return client, False
     
-    def test_projector_connection(self):
-        """Test projector client connection."""
-        print("\nTesting projector client connection...")
-        try:
-            self.projector_client = socketio.Client()
-            
-            connected = False
-            
-            @self.projector_client.on('connect')
-            def on_connect():
-                nonlocal connected
-                connected = True
-                print("  ✓ Projector client connected")
-            
-            @self.projector_client.on('disconnect')
-            def on_disconnect():
-                print("  Projector client disconnected")
-            
-            self.projector_client.connect(self.base_url, wait_timeout=5)
-            time.sleep(1)
-            
-            self.test_results['projector_connection'] = connected and self.projector_client.connected
-            return self.test_results['projector_connection']
-            
-        except Exception as e:
-            print(f"✗ Projector client connection failed: {e}")
-            return False
+    def test_client_connections(self):
+        """Connect the control and projector clients concurrently."""
+        print("\nTesting control and projector client connections...")
+        # The two handshakes are independent: run them side by side instead of back to back
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            control = executor.submit(self._connect_client, 'control')
+            projector = executor.submit(self._connect_client, 'projector')
+            self.control_client, control_ok = control.result()
+            self.projector_client, projector_ok = projector.result()
+        self._record('control_connection', control_ok)
+        self._record('projector_connection', projector_ok)
+        for client, ok in ((self.control_client, control_ok), (self.projector_client, projector_ok)):
+            if ok:
+                self._start_writer(client)
+        return control_ok and projector_ok
+    
+    def _start_writer(self, client):
+        """Give a client one writer thread that performs all of its emits in order."""
+        outbox = SimpleQueue()
+        writer = Thread(target=self._writer, args=(client, outbox), daemon=True)
+        writer.start()
+        self._writers[client] = (outbox, writer)
+    
+    def _writer(self, client, outbox):
+        while True:
+            item = outbox.get()
+            if item is None:
+                return
+            event, args = item
+            try:
+                client.emit(event, *args, callback=self._on_ack)
+            except Exception as e:
+                print(f"  ✗ Emitting {event} failed: {e}")
+    
+    def _stop_writers(self):
+        """Let each writer drain its queue, then wait for it to exit."""
+        for outbox, writer in self._writers.values():
+            outbox.put(None)
+        for outbox, writer in self._writers.values():
+            writer.join(timeout=2)
+        self._writers.clear()
+    
+    def _emit_with_ack(self, client, event, *args):
+        """Queue an event for the client's writer and count it as pending until acknowledged."""
+        with self._ack_lock:
+            self._pending_acks += 1
+            self._acks_done.clear()
+        self._writers[client][0].put((event, args))
+    
+    def _on_ack(self, *args):
+        with self._ack_lock:
+            self._pending_acks -= 1
+            if self._pending_acks == 0:
+                self._acks_done.set()
     
     def test_room_joining(self):
-        """Test room joining functionality."""
-        print("\nTesting room joining...")
+        """Join both rooms and request an update with one bootstrap emit per client.
+        
+        The acknowledgements confirm room joining and message sending in confirm_batch.
+        """
+        print("\nTesting room joining and message sending...")
         try:
             if not self.control_client or not self.control_client.connected:
                 print("  ✗ Control client not connected")
@@ -158,50 +276,41 @@ class WebSocketConnectionTest:
                 print("  ✗ Projector client not connected")
                 return False
             
-            # Join rooms
-            self.control_client.emit('join_room', {'room': 'control'})
-            self.projector_client.emit('join_room', {'room': 'projector'})
-            
-            time.sleep(0.5)
-            
-            self.test_results['room_joining'] = True
-            print("  ✓ Successfully joined rooms")
+            self._emit_with_ack(self.control_client, 'bootstrap', {'rooms': ['control'], 'want_update': True})
+            self._emit_with_ack(self.projector_client, 'bootstrap', {'rooms': ['projector']})
+            self._batch.update(('room_joining', 'message_sending'))
             return True
             
         except Exception as e:
             print(f"  ✗ Room joining failed: {e}")
             return False
     
-    def test_message_sending(self):
-        """Test message sending between clients."""
-        print("\nTesting message sending...")
-        try:
-            if not self.control_client or not self.control_client.connected:
-                print("  ✗ Control client not connected")
-                return False
-            
-            # Send a test message
-            self.control_client.emit('request_update')
-            time.sleep(0.5)
-            
-            self.test_results['message_sending'] = True
-            print("  ✓ Message sent successfully")
-            return True
-            
-        except Exception as e:
-            print(f"  ✗ Message sending failed: {e}")
-            return False
+    def confirm_batch(self, timeout=2):
+        """Wait once for the server to acknowledge every emit sent so far."""
+        print("\nWaiting for server acknowledgements...")
+        acked = self._acks_done.wait(timeout=timeout)
+        for test_name in self._batch:
+            self._record(test_name, acked)
+        self._batch.clear()
+        if acked:
+            print("  ✓ Rooms joined and messages acknowledged")
+        else:
+            print(f"  ✗ {self._pending_acks} emit(s) not acknowledged within {timeout}s")
+        return acked
     
     def test_message_receiving(self):
-        echoes = []
+        echoes = deque(maxlen=32)
+        got = Event()
         
         @self.projector_client.on('calibration_updated')
         def on_calibration(data):
             echoes.append(('calibration_updated', data))
+            got.set()
         
         @self.projector_client.on('layout_updated')
         def on_layout(data):
             echoes.append(('layout_updated', data))
+            got.set()
         
         print("\nTesting message receiving...")
         try:
@@ -209,17 +318,14 @@ class WebSocketConnectionTest:
                 print("  ✗ Projector client not connected")
                 return False
             
-            # Wait a bit for any messages
-            time.sleep(1)
-            
-            # Try to trigger a message
+            # Try to trigger a message, then return as soon as the first one arrives
             if self.control_client and self.control_client.connected:
                 self.control_client.emit('request_update')
-                time.sleep(1)
+            got.wait(timeout=1.5)
             
             # Check if we received any messages
             received = len(echoes) > 0
-            self.test_results['message_receiving'] = received
+            self._record('message_receiving', received)
             
             if received:
                 print(f"  ✓ Received {len(echoes)} message(s)")
@@ -236,49 +342,148 @@ class WebSocketConnectionTest:
         """Clean up connections and stop server."""
         print("\nCleaning up...")
         
+        self._stop_writers()
+        
         if self.control_client and self.control_client.connected:
             self.control_client.disconnect()
         
         if self.projector_client and self.projector_client.connected:
             self.projector_client.disconnect()
         
+        self.http.close()
+        
+        if self._wsgi_server:
+            self._wsgi_server.shutdown()
+            print("✓ Server stopped")
+        
         if self.server_process:
-            try:
-                self.server_process.terminate()
-                self.server_process.wait(timeout=5)
-            except:
-                self.server_process.kill()
+            self._stop_server()
             print("✓ Server stopped")
     
-    def run_all_tests(self, start_server=False):
+    def _stop_server(self):
+        """SIGTERM the server's process group, escalating to SIGKILL after 500 ms."""
+        try:
+            os.killpg(self.server_process.pid, signal.SIGTERM)
+            for _ in range(10):
+                if self.server_process.poll() is not None:
+                    break
+                time.sleep(0.05)
+            else:
+                os.killpg(self.server_process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.server_process.wait()
+    
+    async def _one_client(self, sem, hold):
+        """Connect one AsyncClient under the semaphore; returns when it connected, or None."""
+        client = socketio.AsyncClient(websocket_extra_options=WEBSOCKET_OPTIONS)
+        try:
+            async with sem:
+                await client.connect(self.base_url, wait_timeout=5)
+            connected_at = time.perf_counter()
+            # Hold the connection open outside the semaphore so it does not delay later connects
+            await asyncio.sleep(hold)
+            return connected_at
+        except Exception:
+            return None
+        finally:
+            await client.disconnect()
+    
+    def run_concurrent_connections(self, n, concurrency=500, hold=0.5):
+        """Open n clients from one event loop and report the time until all have connected.
+        
+        Every client holds a socket, so large n needs a raised file descriptor
+        limit (e.g. `ulimit -n 65536`).
+        """
+        if importlib.util.find_spec('aiohttp') is None:
+            print("✗ Stress mode needs aiohttp: pip install aiohttp")
+            return False
+        
+        async def fan_out():
+            sem = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(self._one_client(sem, hold) for _ in range(n)))
+        
+        print(f"Connecting {n} clients ({concurrency} at a time)...")
+        start = time.perf_counter()
+        connect_times = [t for t in asyncio.run(fan_out()) if t is not None]
+        elapsed = max(connect_times) - start if connect_times else 0.0
+        print(f"{len(connect_times)}/{n} clients connected in {elapsed:.2f}s")
+        return len(connect_times) == n
+    
+    async def _raw_ws_stress(self, n):
+        """Send n request_update events over a raw Engine.IO WebSocket; returns the time until
+        the server has handled all of them."""
+        import aiohttp
+        
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(f'{self.base_url}/socket.io/?EIO=4&transport=websocket') as ws:
+                await ws.receive_str()  # Engine.IO open packet
+                await ws.send_str('40')  # Socket.IO connect to the default namespace
+                await ws.receive_str()  # Connect confirmation
+                start = time.perf_counter()
+                # Every event requests an ack: the server may handle events concurrently, so
+                # only n ack replies show it processed all of them (not just that they were sent)
+                for ack_id in range(n):
+                    await ws.send_str(f'42{ack_id}["request_update"]')
+                acked = 0
+                while acked < n:
+                    packet = await ws.receive_str()
+                    if packet == '2':
+                        await ws.send_str('3')  # Engine.IO ping -> pong
+                    elif packet.startswith('43'):
+                        acked += 1
+                return time.perf_counter() - start
+    
+    def run_raw_ws_stress(self, n):
+        """Measure message throughput without the socket.io client's packet handling."""
+        if importlib.util.find_spec('aiohttp') is None:
+            print("✗ Raw WebSocket stress mode needs aiohttp: pip install aiohttp")
+            return False
+        
+        print(f"Sending {n} request_update events over a raw WebSocket...")
+        try:
+            elapsed = asyncio.run(self._raw_ws_stress(n))
+        except Exception as e:
+            print(f"✗ Raw WebSocket stress failed: {e}")
+            return False
+        print(f"Server handled {n} messages in {elapsed:.3f}s ({n / max(elapsed, 1e-9):,.0f} msg/s)")
+        return True
+    
+    def run_all_tests(self, start_server=False, in_process=False):
         """Run all tests."""
         print("=" * 60)
         print("WebSocket Connection Test Suite")
         print("=" * 60)
         
+        # Kill the server on Ctrl-C for the duration of the run; signal handlers can
+        # only be installed from the main thread
+        previous_sigint = None
+        if current_thread() is main_thread():
+            previous_sigint = signal.signal(signal.SIGINT, self._on_sigint)
+        
         try:
             # Start server if requested
             if start_server:
-                if not self.start_server():
+                if not self.start_server(in_process=in_process):
                     print("\nCannot proceed without server. Exiting.")
                     return False
-                self.test_results['server_startup'] = True
+                self._record('server_startup', True)
             else:
                 print("Assuming server is already running...")
             
             # Run tests
             self.check_http_accessible()
             
-            if not self.test_results['http_accessible']:
+            if not self._passed('http_accessible'):
                 print("\n⚠ Server not accessible. Cannot continue tests.")
                 return False
             
-            self.test_control_connection()
-            self.test_projector_connection()
+            self.test_client_connections()
             
-            if self.test_results['control_connection'] and self.test_results['projector_connection']:
+            if self._passed('control_connection') and self._passed('projector_connection'):
+                # Emit once per client, then wait once for all acknowledgements
                 self.test_room_joining()
-                self.test_message_sending()
+                self.confirm_batch()
                 self.test_message_receiving()
             
             # Print summary
@@ -286,11 +491,11 @@ class WebSocketConnectionTest:
             print("Test Results Summary")
             print("=" * 60)
             
-            for test_name, result in self.test_results.items():
-                status = "✓ PASS" if result else "✗ FAIL"
+            for test_name, bit in FLAGS.items():
+                status = "✓ PASS" if self.results & bit else "✗ FAIL"
                 print(f"{test_name:25} {status}")
             
-            all_passed = all(self.test_results.values())
+            all_passed = self.results == ALL_MASK
             print("=" * 60)
             
             if all_passed:
@@ -304,7 +509,11 @@ class WebSocketConnectionTest:
             print("\n\nTest interrupted by user")
             return False
         finally:
-            self.cleanup()
+            try:
+                self.cleanup()
+            finally:
+                if previous_sigint is not None:
+                    signal.signal(signal.SIGINT, previous_sigint)
 
 
 def main():
@@ -316,30 +525,28 @@ def main():
                        help='Base URL of the server (default: http://localhost:5670)')
     parser.add_argument('--start-server', action='store_true',
                        help='Start the server before testing (may not work in all environments)')
+    parser.add_argument('--in-process', action='store_true',
+                       help='With --start-server, serve the app from a thread instead of a flask subprocess')
+    parser.add_argument('--install-deps', action='store_true',
+                       help='pip install the client dependencies if they are missing')
+    parser.add_argument('--stress', type=int, metavar='N',
+                       help='Instead of the test suite, connect N concurrent clients and time it')
+    parser.add_argument('--raw-ws-stress', type=int, metavar='N',
+                       help='Instead of the test suite, send N events over a raw WebSocket and time it')
+    parser.add_argument('--concurrency', type=int, default=500,
+                       help='Maximum connection attempts in flight in stress mode (default: 500)')
     
     args = parser.parse_args()
     
     tester = WebSocketConnectionTest(base_url=args.url)
-    success = tester.run_all_tests(start_server=args.start_server)
+    if args.raw_ws_stress:
+        return 0 if tester.run_raw_ws_stress(args.raw_ws_stress) else 1
+    if args.stress:
+        return 0 if tester.run_concurrent_connections(args.stress, args.concurrency) else 1
+    success = tester.run_all_tests(start_server=args.start_server, in_process=args.in_process)
     
     return 0 if success else 1
 
 
 if __name__ == '__main__':
-    # Install python-socketio client if needed
-    try:
-        import socketio
-    except ImportError:
-        print("Installing python-socketio client...")
-        import subprocess
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'python-socketio[client]'])
-    
-    # Install requests if needed
-    try:
-        import requests
-    except ImportError:
-        print("Installing requests...")
-        import subprocess
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'requests'])
-    
     exit(main())